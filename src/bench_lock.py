@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2009, Regents of the University of California
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#
+#     * Neither the name of the University of California, Los Angeles
+#     nor the names of its contributors may be used to endorse or
+#     promote products derived from this software without specific prior
+#     written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Author: Roy Shea
+# Date: June 2009
+
+import array
+import gc
+import random
+import time
+import tree
+from optparse import OptionParser
+
+def random_tree(num_nodes, seed=0):
+    """Build a random OrderedTreeNode tree with num_nodes nodes."""
+    generator = random.Random(seed)
+    root = tree.OrderedTreeNode("root")
+    open_nodes = [root]
+    for i in range(num_nodes - 1):
+        if len(open_nodes) > 1 and generator.random() < 0.45:
+            open_nodes.pop()
+        open_nodes.append(open_nodes[-1].append_child(generator.randint(0, 9)))
+    return root
+
+
+def three_pass_lock(root, label_dictionary):
+    """Lock a tree using separate depth, interval and label traversals.
+
+    This is how TreeNode.lock_tree worked before the traversals were
+    fused, and is kept as a baseline.
+    """
+    work_list = [(root, 0)]
+    while work_list:
+        (node, depth) = work_list.pop()
+        node.depth = depth
+        for child in node.get_children():
+            work_list.append((child, depth + 1))
+
+    preorder = []
+    levels = []
+    work_list = [(root, False)]
+    while work_list:
+        (node, visited) = work_list.pop()
+        if visited:
+            node.end = len(preorder)
+        else:
+            node.position = len(preorder)
+            node.preorder = preorder
+            node.levels = levels
+            if node.depth == len(levels):
+                levels.append(array.array('i'))
+            levels[node.depth].append(node.position)
+            preorder.append(node)
+            work_list.append((node, True))
+            for child in reversed(node.get_children()):
+                work_list.append((child, False))
+
+    work_list = [root]
+    while work_list:
+        node = work_list.pop()
+        work_list += node.get_children()
+        node.label = label_dictionary.get_label(str(node.state))
+        node.label_dictionary = label_dictionary
+        node.locked = True
+    return
+
+
+def best_time(function, repeat):
+    """Return the fastest of repeat calls to function, in seconds.
+
+    As with timeit, garbage collection is disabled while timing.
+    """
+    times = []
+    for i in range(repeat):
+        gc.disable()
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+        gc.enable()
+    return min(times)
+
+
+if __name__ == '__main__':
+
+    # Handle the command line
+    usage = "usage: %prog [options]"
+    parser = OptionParser(usage)
+
+    parser.add_option("-s", "--sizes", dest="sizes",
+            default="100000,1000000,10000000", help="Comma separated " +
+            "numbers of nodes of the trees to lock.")
+    parser.add_option("-r", "--repeat", dest="repeat", type="int",
+            default="3", help="Number of times each lock is timed.  The " +
+            "fastest is reported.")
+
+    (options, args) = parser.parse_args()
+
+    print "%10s %12s %12s %8s" % ("nodes", "three pass", "fused", "speedup")
+    for num_nodes in [int(size) for size in options.sizes.split(",")]:
+        root = random_tree(num_nodes)
+        label_dictionary = tree.LabelDictionary()
+
+        def lock_three_pass():
+            three_pass_lock(root, label_dictionary)
+        def lock_fused():
+            root.lock_tree(label_dictionary)
+
+        three_pass = best_time(lock_three_pass, options.repeat)
+        fused = best_time(lock_fused, options.repeat)
+        print "%10d %11.3fs %11.3fs %7.2fx" % (num_nodes, three_pass, fused,
+                three_pass / fused)
+        del root
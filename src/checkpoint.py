@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2009, Regents of the University of California
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#
+#     * Neither the name of the University of California, Los Angeles
+#     nor the names of its contributors may be used to endorse or
+#     promote products derived from this software without specific prior
+#     written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Author: Roy Shea
+# Date: June 2009
+
+import array
+import cPickle
+import hashlib
+import os
+import time
+import freqt
+import tree
+import treeio
+
+VERSION = 1
+
+def fingerprint(data):
+    """Return a digest identifying the structure and states of the
+    CompactTree data."""
+    digest = hashlib.sha1()
+    for state in data.get_label_dictionary().states:
+        state = str(state)
+        digest.update("%d:%s" % (len(state), state))
+    digest.update(treeio._int32_bytes(data.labels))
+    digest.update(treeio._int32_bytes(data.parents))
+    return digest.hexdigest()
+
+
+def _as_array(rmos):
+    """Return rmos as an array.array, which pickles without NumPy."""
+    if isinstance(rmos, array.array):
+        return rmos
+    values = array.array('i')
+    if tree.numpy is not None and isinstance(rmos, tree.numpy.ndarray):
+        values.fromstring(rmos.astype(tree.numpy.intc).tostring())
+    else:
+        values.extend(rmos)
+    return values
+
+
+def save_state(state, filename):
+    """Write a mining state to filename.
+
+    The state is first written to a temporary file that then replaces
+    filename, so an interrupted save leaves the last checkpoint intact.
+    """
+    temporary = filename + ".tmp"
+    f = open(temporary, "wb")
+    try:
+        cPickle.dump(state, f, cPickle.HIGHEST_PROTOCOL)
+    finally:
+        f.close()
+    os.rename(temporary, filename)
+    return
+
+
+def load_state(filename):
+    """Read a mining state written by save_state."""
+    f = open(filename, "rb")
+    try:
+        state = cPickle.load(f)
+    finally:
+        f.close()
+    assert state.get("version") == VERSION, "Unknown checkpoint format.\n"
+    return state
+
+
+def checkpointed_freqt(t, minsup, filename, max_size=None, budget=None,
+        interval=60.0):
+    """Find subtrees induced on t with at least minsup support, saving
+    progress to filename.
+
+    Subtrees are found one size at a time as in freqt.  The mining state
+    is saved after each size and at most every interval seconds while a
+    size is being expanded.  It holds every size found so far as lists
+    of (depth, label) sequences and their rmos, the number of subtrees
+    of the last size already expanded, the expansions found from them,
+    and a fingerprint of the data tree.
+
+    If filename already holds a checkpoint for the same tree and minsup,
+    mining resumes from it.  Sizes that are already complete are not
+    recomputed, so a run stopped by max_size or by an exhausted budget
+    can be continued with a larger max_size or a fresh budget.  The
+    budget is checked before each subtree is expanded, and a subtree
+    once started is always expanded in full.
+
+    Returns the subtrees found so far in the structure freqt returns.
+    As with freqt, the result ends with an empty size only when mining
+    is complete.  Subtrees larger than max_size are not explored.
+    """
+
+    t.lock_tree()
+    data = t.get_compact_tree()
+    assert isinstance(data, tree.CompactTree), \
+            "Checkpoints require a CompactTree.\n"
+    threshold = minsup * data.get_support_base()
+    if budget is None:
+        budget = freqt.Budget()
+
+    if os.path.exists(filename):
+        state = load_state(filename)
+        assert state["fingerprint"] == fingerprint(data), \
+                "Checkpoint is for a different tree.\n"
+        assert state["minsup"] == minsup, \
+                "Checkpoint is for a different minsup.\n"
+    else:
+        c1 = freqt.get_c1(data, minsup)
+        state = {"version": VERSION, "fingerprint": fingerprint(data),
+                "minsup": minsup, "expanded": 0, "next": [],
+                "levels": [sorted([(subtree.get_sequence(), _as_array(rmos))
+                    for (subtree, rmos) in c1.items()])]}
+        save_state(state, filename)
+
+    levels = state["levels"]
+    token_space = [sequence[0][1] for (sequence, rmos) in levels[0]]
+    last_save = time.time()
+    while levels[-1] and (max_size is None or len(levels) < max_size) and \
+            not budget.is_exhausted():
+        frontier = levels[-1]
+        while state["expanded"] < len(frontier):
+            if budget.is_exhausted():
+                break
+
+            # Each subtree is expanded in full, so every run makes
+            # progress however small its budget
+            (sequence, rmos) = frontier[state["expanded"]]
+            work = freqt.Budget()
+            expansions = [(subtree.get_sequence(), _as_array(rmo_new)) for
+                    (subtree, rmo_new) in freqt.expand_subtree(data,
+                        freqt.Pattern.from_sequence(sequence), rmos,
+                        threshold, token_space, work)]
+            budget.charge(candidates=work.candidates,
+                    occurrences=sum([len(rmo_new) for
+                        (subtree, rmo_new) in expansions]))
+            state["next"] += expansions
+            state["expanded"] += 1
+            if time.time() - last_save >= interval:
+                save_state(state, filename)
+                last_save = time.time()
+
+        if state["expanded"] < len(frontier):
+            break
+        levels.append(state["next"])
+        state["next"] = []
+        state["expanded"] = 0
+        save_state(state, filename)
+        last_save = time.time()
+    save_state(state, filename)
+
+    # Build the same structure freqt returns
+    label_dictionary = data.get_label_dictionary()
+    frequent_subtrees = {}
+    found = list(levels)
+    if state["next"]:
+        found.append(state["next"])
+    for (size, level) in enumerate(found):
+        frequent_subtrees[size + 1] = dict(
+                [(freqt.Pattern.from_sequence(sequence).get_build_string(
+                    label_dictionary), rmos) for (sequence, rmos) in level])
+    return frequent_subtrees
@@ -36,19 +36,34 @@
 # Author: Roy Shea
 # Date: June 2009
 
+import sys
 import tree
+import treeio
 import freqt
+import writers
 from optparse import OptionParser
 
+WRITERS = {"dot": writers.DotWriter, "jsonl": writers.JsonLinesWriter,
+        "binary": writers.BinaryWriter}
+
 if __name__ == '__main__':
 
     # Handle the command line
     usage = "usage: %prog [options] tree_file minsup"
     parser = OptionParser(usage)
 
-    parser.add_option("-t", "--timeout", dest="timeout", type="int",
-            default="0", help="Bounds the maximum time that any call to" +
-            "frequent_subtrees can take.  Default is no timeout.")
+    parser.add_option("-t", "--timeout", dest="timeout", type="float",
+            default="0", help="Bounds the time in seconds that mining can " +
+            "take.  Default is no timeout.")
+    parser.add_option("-f", "--format", dest="format", default="dot",
+            choices=sorted(WRITERS.keys()), help="Output format, one of " +
+            "dot, jsonl or binary.  Default is dot.")
+    parser.add_option("-c", "--compress", dest="compress",
+            action="store_true", default=False, help="Merge identical " +
+            "subtrees of the tree into a DAG and mine it without " +
+            "expanding it.")
+    parser.add_option("-o", "--output", dest="output", default=None,
+            help="File to write results to.  Default is standard output.")
 
     (options, args) = parser.parse_args()
 
@@ -57,22 +72,24 @@ if __name__ == '__main__':
     (tree_file, minsup_str) = args
     minsup = float(minsup_str)
 
-    # Generate a tree
-    f = open(tree_file)
-    tree_string = f.readline()
-    f.close()
-
-    root = tree.OrderedTreeNode("root")
-    root.build_tree_from_string(tree_string)
+    # Load the tree, streaming the file straight into compact arrays
+    data = treeio.load_file(tree_file, "root", compress=options.compress)
 
-    # Discover subtrees that occur with frequency greater than 0.2 in subtree
-    frequent_subtrees = freqt.freqt(root, minsup, options.timeout)
+    if options.output is None:
+        out = sys.stdout
+    else:
+        out = open(options.output, "wb")
 
-    print "# ==== Size: Original Tree ====\n"
-    print "digraph {\n%s}\n\n" % root.print_tree()
+    if options.format == "dot" and not options.compress:
+        out.write("# ==== Size: Original Tree ====\n\n")
+        out.write("digraph {\n%s}\n\n" % data.get_root().print_tree())
 
-    for key in sorted(frequent_subtrees.keys(), reverse=True):
-        print "# ==== Size: %d ====\n" % key
-        for subtree in frequent_subtrees[key]:
-            print "digraph {\n%s}\n" % \
-                    tree.OrderedTreeNode.unrooted_build_tree_from_string(subtree).print_tree()
+    # Stream subtrees that occur with frequency greater than minsup
+    # straight to the writer as they are found
+    writer = WRITERS[options.format](out, data.get_label_dictionary(),
+            data=data)
+    writer.write_results(freqt.iter_freqt(data, minsup,
+        budget=freqt.Budget(options.timeout or None)))
+    writer.close()
+    if options.output is not None:
+        out.close()
@@ -37,151 +37,935 @@
 # Date: June 2009
 
 import tree
+import array
+import bisect
 import copy
-import sets
-import signal
+import heapq
+import time
+
+class Pattern():
+    """Immutable ordered tree pattern in right most path encoding.
+
+    A pattern with k nodes is the pre-order sequence of the (depth,
+    label) pairs of its nodes, with the root at depth 0.  As in the
+    FREQT paper, this sequence determines the tree, and a right most
+    expansion simply appends one more pair.  Each pattern stores only
+    its last pair and a reference to the pattern it was expanded from,
+    so expansion takes O(1) time and space and the depth of the right
+    most leaf is always at hand.  Hashes are built up incrementally.
+    """
+
+    def __init__(self, label, depth=0, prefix=None):
+        """Create a pattern by adding a node to the end of prefix."""
+        self.label = label
+        self.depth = depth
+        self.prefix = prefix
+        if prefix is None:
+            assert depth == 0, "Patterns must start with a root.\n"
+            self.size = 1
+            self.hash = hash((depth, label))
+        else:
+            assert 0 < depth <= prefix.depth + 1, "Invalid expansion.\n"
+            self.size = prefix.size + 1
+            self.hash = hash((prefix.hash, depth, label))
+
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        return isinstance(other, Pattern) and self.hash == other.hash and \
+                self.size == other.size and \
+                self.get_sequence() == other.get_sequence()
+
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+    def __hash__(self):
+        return self.hash
+
+
+    def get_size(self):
+        """Return the number of nodes in the pattern."""
+        return self.size
+
+
+    def get_rml_depth(self):
+        """Return the depth of the right most leaf of the pattern."""
+        return self.depth
+
+
+    def expand(self, p, l):
+        """Add a node with label l as the last child of the pth parent
+        of the right most leaf."""
+        return Pattern(l, self.depth - p + 1, self)
+
+
+    def get_sequence(self):
+        """Return the tuple of (depth, label) pairs of the pattern."""
+        sequence = []
+        pattern = self
+        while pattern is not None:
+            sequence.append((pattern.depth, pattern.label))
+            pattern = pattern.prefix
+        sequence.reverse()
+        return tuple(sequence)
+
+
+    def get_build_string(self, label_dictionary):
+        """Generate the build string of the pattern.
+
+        Labels are decoded into states using label_dictionary.  The
+        result matches OrderedTreeNode.build_string_from_tree.
+        """
+        tokens = []
+        open_depth = 0
+        for (depth, label) in self.get_sequence():
+            tokens += ["-1"] * (open_depth - depth)
+            tokens.append(str(label_dictionary.get_state(label)))
+            open_depth = depth + 1
+        tokens += ["-1"] * open_depth
+        return " ".join(tokens)
+
+
+    @classmethod
+    def from_sequence(self, sequence):
+        """Build a pattern from a sequence of (depth, label) pairs."""
+        pattern = None
+        for (depth, label) in sequence:
+            pattern = Pattern(label, depth, pattern)
+        return pattern
+
+
+    @classmethod
+    def from_build_string(self, build_string, label_dictionary):
+        """Build a pattern from an unrooted build string.
+
+        States are mapped to labels using label_dictionary.
+        """
+        sequence = []
+        depth = 0
+        for token in build_string.split():
+            if token == '-1':
+                assert depth > 0, "Malformed build string.\n"
+                depth -= 1
+            else:
+                assert depth > 0 or not sequence, "Malformed build string.\n"
+                sequence.append((depth, label_dictionary.get_label(token)))
+                depth += 1
+        assert sequence and depth == 0, "Malformed build string.\n"
+        return Pattern.from_sequence(sequence)
+
+
+class Budget():
+    """Limits on the work done by one mining run.
+
+    A budget bounds the wall clock time from its creation, the number
+    of candidate expansions examined, and the number of occurrence
+    entries kept in results.  Limits left as None are not checked.
+    Miners charge their work to the budget as they go and stop cleanly
+    once it is exhausted, so unlike a signal based timeout a budget
+    works in any thread and gives partial results for the current
+    level.
+    """
+
+    def __init__(self, timeout=None, max_candidates=None,
+            max_occurrences=None):
+        if timeout is None:
+            self.deadline = None
+        else:
+            self.deadline = time.time() + timeout
+        self.max_candidates = max_candidates
+        self.max_occurrences = max_occurrences
+        self.candidates = 0
+        self.occurrences = 0
+        self.exhausted = False
+
+
+    def charge(self, candidates=0, occurrences=0):
+        """Record work done and return whether the budget is exhausted."""
+        self.candidates += candidates
+        self.occurrences += occurrences
+        return self.is_exhausted()
+
+
+    def is_exhausted(self):
+        """Return whether any limit has been passed.
+
+        Once exhausted a budget stays exhausted.
+        """
+        if not self.exhausted:
+            self.exhausted = \
+                    (self.deadline is not None and
+                            time.time() >= self.deadline) or \
+                    (self.max_candidates is not None and
+                            self.candidates > self.max_candidates) or \
+                    (self.max_occurrences is not None and
+                            self.occurrences > self.max_occurrences)
+        return self.exhausted
+
 
 def get_c1(root, minsup):
-    """Find the right most leaf of occurrences of minsup frequent 1-itemsets."""
+    """Find the right most leaf of occurrences of minsup frequent 1-itemsets.
 
-    num_nodes = root.get_num_nodes()
+    Occurrences are returned as sorted arrays of pre-order positions
+    within root.get_compact_tree().
+    """
 
-    # Track the number of times each size one subtree appears as the
-    # state of a node within the tree rooted at root.
-    rmo = {}
-    for node in root.get_nodes():
-        subtree = tree.OrderedTreeNode(node.state)
-        subtree_string = subtree.build_string_from_tree()
-        rmo[subtree_string] = rmo.setdefault(subtree_string, []) + [node]
+    data = root.get_compact_tree()
+    threshold = minsup * data.get_support_base()
 
     # Only keep track of the tokens that occur with frequency greater
     # than minsup.
     minsup_frequent = {}
-    for (sts, rmos) in rmo.items():
-        if len(rmos) > minsup * num_nodes:
-            minsup_frequent[sts] = rmos
+    for (label, rmos) in data.get_label_occurrences().items():
+        if data.count_support(rmos) > threshold:
+            minsup_frequent[Pattern(label)] = rmos
     return minsup_frequent
 
 
 def pl_expand(t, p, l):
-    """PL expand a tree.
+    """PL expand a pattern.
 
-    Expand tree t by adding node with label l to the p-th parent of the
-    right most leaf."""
+    Expand pattern t by adding node with label l to the p-th parent of
+    the right most leaf."""
 
-    expanded = tree.OrderedTreeNode.unrooted_build_tree_from_string(t)
-    rml = expanded.get_right_most_leaf()
-    pth_parent = rml.get_pth_parent(p)
-    pth_parent.append_child(l)
-    return expanded
+    return t.expand(p, l)
 
 
 def update_rmo(t, rmos, p, l):
-    """Update the RMO information for a tree."""
+    """Update the RMO information for a tree.
 
-    # Get nodes that will be tested for expansion
-    children = []
-    for rmo in rmos:
-        pth_parent = rmo.get_pth_parent(p)
-        if pth_parent == rmo:
-            # Try expanding directly below the rmo.
-            children += pth_parent.get_children()
-        else:
-            # Try expanding children that are:
-            # - below the pth parent of rmo
-            # - after this branch
-            p_less_one_parent = rmo.get_pth_parent(p-1)
-            index = pth_parent.get_children().index(p_less_one_parent)
-            children += pth_parent.get_children()[index+1:]
+    rmos and the result are sorted arrays of positions within
+    t.get_compact_tree().  The expansion is computed in bulk over the
+    whole array.
+    """
 
-    # Unique-ify the children to prevent duplicate checks
-    children = list(sets.Set(children))
+    return t.get_compact_tree().expand_occurrences(rmos, p, l)
 
-    # Try l-expanding each node
-    rmo_new = [child for child in children if child.state == l]
 
-    return rmo_new
+def expand_subtree(data, subtree, rmos, threshold, token_space,
+        budget=None):
+    """Yield the frequent right most expansions of one subtree.
 
+    data is a CompactTree and rmos the right most occurrences of
+    subtree within it.  Pairs of an expanded subtree and its right most
+    occurrences are generated for every expansion occurring more than
+    threshold times, one parent distance at a time.
+
+    The candidate children scanned at each parent distance are charged
+    to budget, if given, and no further parent distances are scanned
+    once it is exhausted.
+    """
 
-def expand_trees(t, candidates, minsup, token_space):
+    for parent_distance in range(subtree.get_rml_depth() + 1):
+        if budget is not None and budget.is_exhausted():
+            return
+        expansions = data.group_expansions(rmos, parent_distance,
+                token_space, threshold, budget)
+        for (token, rmo_new) in expansions.items():
+            if data.count_support(rmo_new) > threshold:
+                yield (pl_expand(subtree, parent_distance, token), rmo_new)
+
+
+def expand_trees(t, candidates, minsup, token_space, budget=None):
     """Expand candidates on data tree.
 
     Examine the subtrees within candidates.  Expand each subtree using
-    each token from token_space.  For each such expanded subtree, see if
+    each label from token_space.  For each such expanded subtree, see if
     it appears with frequency greater than minsup within the data tree
     t.
+
+    The occurrences of each subtree are scanned once per parent
+    distance, yielding the expansions by every label together.  Only
+    the expansions that occur with frequency greater than minsup are
+    returned, so infrequent candidates are never stored.
+
+    If a budget is given the occurrences of the returned expansions are
+    charged to it, and only the expansions found before it is exhausted
+    are returned.
     """
 
-    c_new = {}
+    data = t.get_compact_tree()
+    threshold = minsup * data.get_support_base()
+    minsup_frequent = {}
+
+    for (subtree, rmos) in candidates.items():
+        for (candidate, rmo_new) in expand_subtree(data, subtree, rmos,
+                threshold, token_space, budget):
+            assert candidate not in minsup_frequent
+            minsup_frequent[candidate] = rmo_new
+            if budget is not None and \
+                    budget.charge(occurrences=len(rmo_new)):
+                return minsup_frequent
 
-    # For each subtree
-    for (subtree_string, rmos) in candidates.items():
+    return minsup_frequent
 
-        # Construct subtree, locate right most leaf, and its depth
-        subtree = tree.OrderedTreeNode.unrooted_build_tree_from_string(subtree_string)
-        right_most_leaf = subtree.get_right_most_leaf()
-        subtree.lock_tree()
-        rml_depth = right_most_leaf.get_depth()
 
-        # For each parent_distance (distance from rml) and token combination
-        for parent_distance in range(rml_depth + 1):
-            subtree_string = subtree.build_string_from_tree()
-            for token in token_space:
+def _iter_level_wise(data, c1, threshold, token_space, max_size, budget=None):
+    """Yield frequent subtrees and their rmos one size at a time."""
 
-                # Create a larger candidate subtree and locate its rmos
-                # within the tree t.
-                candidate = pl_expand(subtree_string, parent_distance, token)
-                candidate_string = candidate.build_string_from_tree()
-                assert candidate_string not in c_new
-                c_new[candidate_string] = update_rmo(t, rmos, parent_distance, token)
+    for (subtree, rmos) in c1.items():
+        yield (subtree, rmos)
 
-    # Only keep track of the tokens that occur with frequency greater
-    # than minsup.
-    num_nodes = t.get_num_nodes()
+    level = c1.items()
+    while level and (max_size is None or level[0][0].get_size() < max_size):
+        next_level = []
+        for (subtree, rmos) in level:
+            if budget is not None and budget.is_exhausted():
+                return
+            for expansion in expand_subtree(data, subtree, rmos, threshold,
+                    token_space, budget):
+                yield expansion
+                next_level.append(expansion)
+        level = next_level
+
+
+def _iter_depth_first(data, c1, threshold, token_space, max_size,
+        budget=None):
+    """Yield frequent subtrees and their rmos depth first.
+
+    c1 maps the subtrees to start from to their rmos.  These are
+    yielded along with all of their frequent expansions.
+    """
+
+    # Stack of generators of the expansions still to visit at each
+    # size along the current path
+    work_list = [iter(c1.items())]
+    while work_list:
+        if budget is not None and budget.is_exhausted():
+            return
+        expansion = next(work_list[-1], None)
+        if expansion is None:
+            work_list.pop()
+            continue
+
+        yield expansion
+        (subtree, rmos) = expansion
+        if max_size is None or subtree.get_size() < max_size:
+            work_list.append(expand_subtree(data, subtree, rmos, threshold,
+                token_space, budget))
+
+
+def group_root_extensions(data, subtree, rmos):
+    """Group the occurrences of subtree by the label of the parent of
+    their root.
+
+    The root of an occurrence is found rml depth above its right most
+    leaf.  Each group holds the rmos of subtree placed below a new root
+    with that label.  Occurrences rooted at the root of a tree are left
+    out.
+    """
+
+    depth = subtree.get_rml_depth()
+    groups = {}
+    for rmo in rmos:
+        parent = data.parents[data.get_pth_parent(int(rmo), depth)]
+        if parent >= 0:
+            groups.setdefault(data.labels[parent],
+                    array.array('i')).append(int(rmo))
+    return groups
+
+
+def _insert_leaf(sequence, children, ends, x, slot, label):
+    """Return the sequence of a pattern with a leaf labelled label added
+    below node x, before its child number slot or after its last child
+    if there is no such child."""
+    if slot < len(children[x]):
+        position = children[x][slot]
+    else:
+        position = ends[x]
+    leaf = (sequence[x][0] + 1, label)
+    return sequence[:position] + (leaf,) + sequence[position:]
+
+
+def group_left_extensions(data, subtree, rmos):
+    """Group the occurrences of subtree by the supertrees with one more
+    node that keep its right most leaf.
+
+    These add a leaf to the left of the right most path or below a node
+    off it, and are the one node supertrees that are neither right most
+    expansions nor root extensions.  The nodes on the right most path
+    of the occurrences ending at a rmo are fixed, while the subtrees to
+    their left may be placed in several ways.  Below each node of the
+    path, the children to the left of the path are matched greedily
+    from the left and from the right, and a new leaf may go between the
+    two matches around any slot.  The same is done inside each left
+    subtree, for every data node it can be placed at.
+
+    Returns a dictionary mapping the sequence of each supertree to the
+    sorted array of the rmos of subtree that it extends, which are the
+    rmos of the supertree.
+    """
+
+    sequence = subtree.get_sequence()
+    children = [[] for node in sequence]
+    ends = [len(sequence)] * len(sequence)
+    path = []
+    for (node, (depth, label)) in enumerate(sequence):
+        while len(path) > depth:
+            ends[path.pop()] = node
+        if path:
+            children[path[-1]].append(node)
+        path.append(node)
+
+    labels = data.labels
+    data_ends = data.ends
+    def data_children(position, stop):
+        found = []
+        child = position + 1
+        while child < stop:
+            found.append(child)
+            child = int(data_ends[child])
+        return found
+
+    embedded = {}
+    def embeds(node, position):
+        """Return whether the pattern subtree at node fits at position."""
+        key = (node, position)
+        if key not in embedded:
+            fits = labels[position] == sequence[node][1]
+            if fits:
+                candidates = iter(data_children(position,
+                    int(data_ends[position])))
+                for child in children[node]:
+                    for candidate in candidates:
+                        if embeds(child, candidate):
+                            break
+                    else:
+                        fits = False
+                        break
+            embedded[key] = fits
+        return embedded[key]
+
+    inner = {}
+    def extend(node, nodes, positions):
+        """Return the (node, slot, label) leaves that can be added below
+        node when its children nodes are matched to positions."""
+        matched = [-1]
+        index = 0
+        for child in nodes:
+            while not embeds(child, positions[index]):
+                index += 1
+            matched.append(index)
+            index += 1
+        following = [len(positions)] * (len(nodes) + 1)
+        index = len(positions) - 1
+        for slot in range(len(nodes) - 1, -1, -1):
+            while not embeds(nodes[slot], positions[index]):
+                index -= 1
+            following[slot] = index
+            index -= 1
+
+        found = set()
+        for slot in range(len(nodes) + 1):
+            for index in range(matched[slot] + 1, following[slot]):
+                found.add((node, slot, int(labels[positions[index]])))
+        for slot in range(len(nodes)):
+            for index in range(matched[slot] + 1, following[slot + 1]):
+                position = positions[index]
+                if embeds(nodes[slot], position):
+                    key = (nodes[slot], position)
+                    if key not in inner:
+                        inner[key] = extend(nodes[slot],
+                                children[nodes[slot]],
+                                data_children(position,
+                                    int(data_ends[position])))
+                    found |= inner[key]
+        return found
+
+    supertrees = {}
+    groups = {}
+    depth = subtree.get_rml_depth()
+    for rmo in rmos:
+        found = set()
+        below = int(rmo)
+        for level in range(depth - 1, -1, -1):
+            position = data.get_pth_parent(int(rmo), depth - level)
+            found |= extend(path[level], children[path[level]][:-1],
+                    data_children(position, below))
+            below = position
+        for key in found:
+            if key not in supertrees:
+                supertrees[key] = _insert_leaf(sequence, children, ends,
+                        *key)
+            groups.setdefault(supertrees[key], set()).add(int(rmo))
+    for (supertree, group) in groups.items():
+        groups[supertree] = array.array('i', sorted(group))
+    return groups
+
+
+def check_closed(data, subtree, rmos, threshold, token_space, maximal=False,
+        budget=None):
+    """Find the frequent expansions of subtree and whether it is closed.
+
+    A subtree is closed if no subtree with one more node has the same
+    support, and maximal if none with one more node is frequent.  Every
+    such supertree is either a right most expansion, the subtree placed
+    below a new root, or one of the supertrees found by
+    group_left_extensions.
+
+    Returns a pair of whether subtree is closed (or maximal) and the list
+    of its frequent (expansion, rmos) pairs.  When data has monotone
+    support and every occurrence of subtree sits below parents with one
+    label, then so does every occurrence of its expansions, none of
+    which can be closed, and no expansions are returned.  In a single
+    tree the subtrees below such parents need not be mined, as their
+    prefixes need not be frequent, so this pruning is only done for
+    monotone support.  If budget is exhausted while expanding, the
+    result is incomplete.
+    """
+
+    root_extensions = group_root_extensions(data, subtree, rmos)
+    if data.has_monotone_support() and len(root_extensions) == 1 and \
+            len(root_extensions.values()[0]) == len(rmos):
+        return (False, [])
+
+    expansions = list(expand_subtree(data, subtree, rmos, threshold,
+        token_space, budget))
+    supports = [data.count_support(rmo_new) for (expansion, rmo_new) in
+            expansions]
+    supports += [data.count_support(rmo_new) for rmo_new in
+            root_extensions.values()]
+    support = data.count_support(rmos)
+    def is_closed(supports):
+        if maximal:
+            return max(supports + [threshold]) <= threshold
+        return support not in supports
+
+    # Supertrees to the left of the right most path are only checked
+    # when the cheaper ones leave the subtree closed
+    closed = is_closed(supports)
+    if closed:
+        closed = is_closed([data.count_support(rmo_new) for rmo_new in
+            group_left_extensions(data, subtree, rmos).values()])
+    return (closed, expansions)
+
+
+def _iter_closed(data, c1, threshold, token_space, max_size, maximal,
+        depth_first, budget=None):
+    """Yield closed (or maximal) subtrees and their rmos.
+
+    Branches whose subtrees can not be closed are not explored.
+    Subtrees are yielded one size at a time, or depth first.
+    """
+
+    work_list = [iter(c1.items())]
+    while work_list:
+        if depth_first:
+            expansion = next(work_list[-1], None)
+        else:
+            expansion = next(work_list[0], None)
+        if expansion is None:
+            work_list.pop(-1 if depth_first else 0)
+            continue
+
+        (subtree, rmos) = expansion
+        (closed, expansions) = check_closed(data, subtree, rmos, threshold,
+                token_space, maximal, budget)
+        if budget is not None and budget.is_exhausted():
+            return
+        if closed:
+            yield expansion
+        if expansions and (max_size is None or subtree.get_size() < max_size):
+            work_list.append(iter(expansions))
+
+
+def iter_freqt(t, minsup, depth_first=False, max_size=None, mode="all",
+        budget=None):
+    """Generate the subtrees induced on t with at least minsup support.
+
+    This finds the same subtrees as freqt, but yields a tuple (size,
+    pattern, support, rmos) for each subtree as soon as it is found.
+    pattern is a Pattern, support the number of right most occurrences
+    (or of trees holding one, when mining a Forest) and rmos the sorted
+    array of their positions in t.get_compact_tree().  When t is a
+    tree.CompressedTree, rmos is instead the sorted list of its (node,
+    path) occurrences, which CompressedTree.get_positions maps to
+    positions.  Mining only advances as results are consumed, and stops
+    if the consumer stops iterating.
+
+    Subtrees are found one size at a time, or if depth_first is set by
+    exploring each subtree's expansions before moving on to its
+    siblings.  Depth first mining holds only the subtrees along the
+    current path of expansions in memory.  Subtrees larger than
+    max_size are not explored.
+
+    mode "closed" only yields the subtrees that check_closed finds to
+    be closed, and mode "maximal" only those that are maximal.  Branches
+    that can not hold a closed subtree are pruned while mining rather
+    than filtered afterwards.  These modes are not supported on a
+    tree.CompressedTree.
+
+    If a budget is given, the occurrences of the subtrees yielded are
+    charged to it and mining stops once it is exhausted.
+    """
+
+    t.lock_tree()
+    data = t.get_compact_tree()
+    threshold = minsup * data.get_support_base()
+
+    c1 = get_c1(data, minsup)
+    token_space = [pattern.label for pattern in c1.keys()]
+
+    assert mode in ("all", "closed", "maximal"), "Unknown mode.\n"
+    assert mode == "all" or isinstance(data, tree.CompactTree), \
+            "Closed and maximal mining require a CompactTree.\n"
+    if mode != "all":
+        subtrees = _iter_closed(data, c1, threshold, token_space, max_size,
+                mode == "maximal", depth_first, budget)
+    elif depth_first:
+        subtrees = _iter_depth_first(data, c1, threshold, token_space,
+                max_size, budget)
+    else:
+        subtrees = _iter_level_wise(data, c1, threshold, token_space,
+                max_size, budget)
+    for (subtree, rmos) in subtrees:
+        yield (subtree.get_size(), subtree, data.count_support(rmos), rmos)
+        if budget is not None and budget.charge(occurrences=len(rmos)):
+            return
+
+
+def freqt_dfs(t, minsup, callback, max_size=None, mode="all", budget=None):
+    """Find subtrees induced on t with at least minsup support, depth
+    first.
+
+    Each frequent subtree is passed to callback as callback(size,
+    pattern, support, rmos).  See iter_freqt.
+    """
+
+    for (size, pattern, support, rmos) in iter_freqt(t, minsup, True,
+            max_size, mode, budget):
+        callback(size, pattern, support, rmos)
+    return
+
+
+def topk_freqt(t, k, min_size=1, max_size=None):
+    """Find the k most frequent subtrees induced on t with at least
+    min_size nodes.
+
+    Rather than taking a minimum support, the support threshold starts
+    at zero and is raised to that of the kth best subtree found so far
+    as they are discovered.  Subtrees are explored depth first, most
+    frequent expansions first, and as in freqt a subtree is only
+    expanded if its support reaches the current threshold.  Every subtree
+    freqt finds with a minsup just below the final kth best support is
+    visited, without having to guess that minsup.  Support in a single
+    tree can grow with the subtree, so subtrees reached through an
+    infrequent prefix while the threshold was still low may also be kept.
+
+    Returns a list of at most k (support, build string, rmos) tuples
+    sorted by decreasing support.  Subtrees larger than max_size are not
+    explored.
+    """
+
+    if k <= 0:
+        return []
+
+    t.lock_tree()
+    data = t.get_compact_tree()
+
+    # Min heap of the best k (support, sequence, subtree, rmos) found
+    best = []
+
+    def threshold():
+        """Support that a subtree must reach to be kept."""
+        if len(best) < k:
+            return 0
+        return best[0][0]
+
+    def by_support(expansions):
+        """Return expansions ordered by decreasing support."""
+        expansions = [(data.count_support(rmos), subtree, rmos) for
+                (subtree, rmos) in expansions]
+        expansions.sort(key=lambda expansion: expansion[0], reverse=True)
+        return iter(expansions)
+
+    c1 = get_c1(data, 0)
+    token_space = [pattern.label for pattern in c1.keys()]
+
+    # Stack of the expansions still to visit at each size along the
+    # current path
+    work_list = [by_support(c1.items())]
+    while work_list:
+        expansion = next(work_list[-1], None)
+        if expansion is None:
+            work_list.pop()
+            continue
+
+        (support, subtree, rmos) = expansion
+        if support < threshold():
+            # Remaining expansions at this size are no more frequent
+            work_list.pop()
+            continue
+
+        if subtree.get_size() >= min_size:
+            entry = (support, subtree.get_sequence(), subtree, rmos)
+            if len(best) < k:
+                heapq.heappush(best, entry)
+            elif entry[:2] > best[0][:2]:
+                heapq.heapreplace(best, entry)
+
+        if max_size is None or subtree.get_size() < max_size:
+            work_list.append(by_support(expand_subtree(data, subtree, rmos,
+                threshold() - 1, token_space)))
+
+    label_dictionary = data.get_label_dictionary()
+    best.sort(reverse=True)
+    return [(support, subtree.get_build_string(label_dictionary), rmos)
+            for (support, sequence, subtree, rmos) in best]
+
+
+def close_trees(t, candidates, minsup, token_space, maximal=False,
+        budget=None):
+    """Split candidates into the closed ones and their expansions.
+
+    Returns a pair of dicts holding the closed (or maximal) candidates
+    and the frequent expansions of the candidates that may lead to
+    closed subtrees.  See check_closed.  If a budget is given the
+    occurrences of the closed candidates are charged to it, and only the
+    candidates checked before it is exhausted are returned.
+    """
+
+    data = t.get_compact_tree()
+    threshold = minsup * data.get_support_base()
+    closed_subtrees = {}
     minsup_frequent = {}
-    for (cs, rmos) in c_new.items():
-        if len(rmos) > minsup * num_nodes:
-            minsup_frequent[cs] = rmos
-    return minsup_frequent
 
+    for (subtree, rmos) in candidates.items():
+        (closed, expansions) = check_closed(data, subtree, rmos, threshold,
+                token_space, maximal, budget)
+        if budget is not None and budget.is_exhausted():
+            break
+        if closed:
+            closed_subtrees[subtree] = rmos
+            if budget is not None:
+                budget.charge(occurrences=len(rmos))
+        for (candidate, rmo_new) in expansions:
+            minsup_frequent[candidate] = rmo_new
 
-class FreqtTimeout(Exception):
-    """Minimal error used when the Freqt computation takes too long."""
-    pass
+    return (closed_subtrees, minsup_frequent)
 
 
-def alarm_handler(signum, frame):
-    raise FreqtTimeout
+def freqt(t, minsup, timeout=0, mode="all", budget=None):
+    """Find subtrees induced on t with at least minsup support.
 
+    Mining works on Pattern encodings over the integer labels assigned
+    when the tree is locked.  Patterns are only converted into build
+    strings of node states once mining completes.
 
-def freqt(t, minsup, timeout=0):
-    """Find subtrees induced on t with at least minsup support."""
+    t may also be a tree.Forest, in which case the support of a subtree
+    is the fraction of the trees in the forest that it occurs in.
 
-    # Setup for the function
-    signal.signal(signal.SIGALRM, alarm_handler)
+    mode "closed" or "maximal" only returns the closed or maximal
+    subtrees, pruning branches that can not hold any.  See iter_freqt.
 
-    # Lock the tree to calculate per-node data used by analysis
+    Mining stops once budget is exhausted, or after timeout seconds if
+    no budget is given and timeout is not 0.  The subtrees found so far
+    are returned, including any found of the size being mined when the
+    budget ran out.  A complete result ends with an empty size.  Closed
+    and maximal results may also hold empty sizes before that, so a
+    result is interrupted exactly when budget.exhausted is set, and its
+    trailing empty sizes are then dropped.
+    """
+
+    if budget is None:
+        budget = Budget(timeout or None)
+
+    # Lock the tree to calculate per-node data used by analysis, and
+    # mine over its array backed form
     t.lock_tree()
+    t = t.get_compact_tree()
 
     # Store frequent subtrees indexed by tree size
     frequent_subtrees = {}
     subtree_size = 1
-    frequent_subtrees[subtree_size] = get_c1(t, minsup)
-    token_space = [sub_str.split()[0] for sub_str in frequent_subtrees[subtree_size].keys()]
-
-    while len(frequent_subtrees[subtree_size]) > 0:
-        signal.alarm(timeout)
-        try:
-            expanded = expand_trees(t, frequent_subtrees[subtree_size],
-                    minsup, token_space)
-        except FreqtTimeout:
-            # On timeout remove the last potentially incomplete data for
-            # trees of size subtree_size.  Return what has been
-            # computed.
+    candidates = get_c1(t, minsup)
+    token_space = [pattern.label for pattern in candidates.keys()]
+    assert mode in ("all", "closed", "maximal"), "Unknown mode.\n"
+    assert mode == "all" or isinstance(t, tree.CompactTree), \
+            "Closed and maximal mining require a CompactTree.\n"
+    if mode == "all":
+        budget.charge(occurrences=sum([len(rmos) for rmos in
+            candidates.values()]))
+
+    while True:
+        if mode == "all" or not candidates:
+            frequent_subtrees[subtree_size] = candidates
+        if not candidates or budget.is_exhausted():
             break
 
-        signal.alarm(0)
+        if mode == "all":
+            candidates = expand_trees(t, candidates, minsup, token_space,
+                    budget)
+        else:
+            (closed, candidates) = close_trees(t, candidates, minsup,
+                    token_space, mode == "maximal", budget)
+            frequent_subtrees[subtree_size] = closed
+            if budget.is_exhausted():
+                # The expansions of a partly checked size are not kept
+                break
+        subtree_size += 1
+
+    # Empty sizes ending an interrupted result would read as complete
+    while budget.is_exhausted() and frequent_subtrees and \
+            not frequent_subtrees[max(frequent_subtrees.keys())]:
+        del frequent_subtrees[max(frequent_subtrees.keys())]
+
+    # Only generate build strings once mining is done
+    label_dictionary = t.get_label_dictionary()
+    for (size, subtrees) in frequent_subtrees.items():
+        frequent_subtrees[size] = dict(
+                [(pattern.get_build_string(label_dictionary), rmos)
+                    for (pattern, rmos) in subtrees.items()])
+
+    return frequent_subtrees
+
+
+def _concatenate(first, second):
+    """Join two sorted arrays of positions, the second following the
+    first."""
+    if tree.numpy is not None:
+        return tree.numpy.concatenate((tree.as_numpy_array(first),
+            tree.as_numpy_array(second)))
+    return array.array('i', first) + array.array('i', second)
+
+
+def _appendable(data, rmos, p, path):
+    """Return the rmos whose pth parent lies on path.
+
+    path is the right most path of data before nodes were appended, so
+    of the rmos on existing nodes these are the only ones that can
+    expand onto new nodes.  An existing position at depth d has
+    path[d - p] as its pth parent exactly when it follows that node in
+    pre-order.
+    """
+
+    if tree.numpy is not None:
+        rmos = tree.as_numpy_array(rmos)
+        depths = tree.as_numpy_array(data.depths)[rmos] - p
+        keep = (depths >= 0) & (depths < len(path))
+        rmos = rmos[keep]
+        path = tree.as_numpy_array(path)
+        return rmos[rmos >= path[depths[keep]]]
+
+    appendable = array.array('i')
+    for rmo in rmos:
+        depth = data.depths[rmo] - p
+        if 0 <= depth < len(path) and rmo >= path[depth]:
+            appendable.append(rmo)
+    return appendable
+
+
+def incremental_freqt(t, minsup, previous, subtrees):
+    """Update the result of freqt after appending subtrees to t.
+
+    t is a CompactTree or Forest and previous the complete result of
+    freqt(t, minsup).  subtrees is a list of (tree string, parent)
+    pairs that are appended to t in order using t.append_subtree.
+    Returns the result freqt(t, minsup) would give for the grown tree.
+
+    New nodes follow every existing node in pre-order, so the right
+    most occurrences in previous remain valid and each new occurrence
+    ends on a new node.  Occurrences of a previously frequent subtree
+    are only expanded if their pth parent lies on the old right most
+    path, where the new nodes hang.  A subtree that was not frequent
+    had at most the old threshold of occurrences, so its full
+    occurrences are only found when its new ones could make it
+    frequent.
+    """
+
+    data = t.get_compact_tree()
+    assert isinstance(data, tree.CompactTree), \
+            "Incremental mining requires a CompactTree.\n"
+    label_dictionary = data.get_label_dictionary()
+    old_threshold = minsup * data.get_support_base()
+    old_num_nodes = data.get_num_nodes()
+    path = data.get_right_most_path()
+
+    for (tree_string, parent) in subtrees:
+        data.append_subtree(tree_string, parent)
+    threshold = minsup * data.get_support_base()
+
+    # Index the previous result by pattern, and by the pattern each
+    # subtree was expanded from
+    old = {}
+    old_children = {}
+    for level in previous.values():
+        for (build_string, rmos) in level.items():
+            pattern = Pattern.from_build_string(build_string,
+                    label_dictionary)
+            old[pattern] = rmos
+            if pattern.prefix is not None:
+                p = pattern.prefix.depth - pattern.depth + 1
+                old_children.setdefault((pattern.prefix, p),
+                        {})[pattern.label] = rmos
+
+    def appended_only(rmos):
+        """Return the occurrences on appended nodes."""
+        return rmos[bisect.bisect_left(rmos, old_num_nodes):]
+
+    # Frequent single nodes
+    appended = {}
+    for position in range(old_num_nodes, data.get_num_nodes()):
+        appended.setdefault(data.labels[position],
+                array.array('i')).append(position)
+    candidates = {}
+    occurrences = None
+    for (label, rmo_new) in appended.items():
+        pattern = Pattern(label)
+        if pattern in old:
+            candidates[pattern] = _concatenate(old[pattern], rmo_new)
+        elif old_threshold + data.count_support(rmo_new) > threshold:
+            if occurrences is None:
+                occurrences = data.get_label_occurrences()
+            candidates[pattern] = occurrences[label]
+    for (pattern, rmos) in old.items():
+        if pattern.get_size() == 1 and pattern not in candidates:
+            candidates[pattern] = rmos
+    level = [(pattern, rmos, pattern in old) for (pattern, rmos) in
+            candidates.items() if data.count_support(rmos) > threshold]
+    token_space = [pattern.label for (pattern, rmos, known) in level]
+
+    frequent_subtrees = {}
+    subtree_size = 1
+    while level:
+        frequent_subtrees[subtree_size] = dict(
+                [(pattern.get_build_string(label_dictionary), rmos)
+                    for (pattern, rmos, known) in level])
+        next_level = []
+        for (subtree, rmos, known) in level:
+            if not known:
+                for (expansion, rmo_new) in expand_subtree(data, subtree,
+                        rmos, threshold, token_space):
+                    next_level.append((expansion, rmo_new, False))
+                continue
+
+            for p in range(subtree.get_rml_depth() + 1):
+                children = old_children.get((subtree, p), {})
+                split = bisect.bisect_left(rmos, old_num_nodes)
+                groups = data.group_expansions(_concatenate(
+                    _appendable(data, rmos[:split], p, path), rmos[split:]),
+                    p, token_space)
+                expansions = None
+                for label in token_space:
+                    rmo_new = appended_only(groups.get(label, data._empty()))
+                    if label in children:
+                        rmo_new = _concatenate(children[label], rmo_new)
+                    elif old_threshold + data.count_support(rmo_new) > \
+                            threshold:
+                        if expansions is None:
+                            expansions = data.group_expansions(rmos, p,
+                                    token_space, threshold)
+                        rmo_new = expansions.get(label, data._empty())
+                    else:
+                        continue
+                    if data.count_support(rmo_new) > threshold:
+                        next_level.append((subtree.expand(p, label), rmo_new,
+                            label in children))
+        level = next_level
         subtree_size += 1
-        frequent_subtrees[subtree_size] = expanded
 
+    frequent_subtrees[subtree_size] = {}
     return frequent_subtrees
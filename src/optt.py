@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2009, Regents of the University of California
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#
+#     * Neither the name of the University of California, Los Angeles
+#     nor the names of its contributors may be used to endorse or
+#     promote products derived from this software without specific prior
+#     written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Author: Roy Shea
+# Date: June 2009
+
+import heapq
+import math
+import freqt
+
+# Scores of a pattern found in x of num_positive positive trees and y of
+# num_negative negative trees.  Each measures how well the presence of
+# the pattern splits the two classes, and each is convex in (x, y),
+# which is what the pruning in optt relies on.
+
+def _entropy(p):
+    """Binary entropy of probability p."""
+    if p <= 0.0 or p >= 1.0:
+        return 0.0
+    return -p * math.log(p, 2) - (1.0 - p) * math.log(1.0 - p, 2)
+
+
+def _gini_impurity(p):
+    """Gini impurity of probability p."""
+    return 2.0 * p * (1.0 - p)
+
+
+def _impurity_decrease(impurity, x, y, num_positive, num_negative):
+    """Decrease in impurity from splitting the trees by the pattern."""
+    total = float(num_positive + num_negative)
+    covered = x + y
+    uncovered = total - covered
+    split = 0.0
+    if covered > 0:
+        split += covered / total * impurity(x / float(covered))
+    if uncovered > 0:
+        split += uncovered / total * \
+                impurity((num_positive - x) / float(uncovered))
+    return impurity(num_positive / total) - split
+
+
+def information_gain(x, y, num_positive, num_negative):
+    """Information gain of splitting the trees by the pattern."""
+    return _impurity_decrease(_entropy, x, y, num_positive, num_negative)
+
+
+def gini(x, y, num_positive, num_negative):
+    """Decrease in Gini impurity of splitting the trees by the pattern."""
+    return _impurity_decrease(_gini_impurity, x, y, num_positive,
+            num_negative)
+
+
+def chi_square(x, y, num_positive, num_negative):
+    """Chi-square statistic of the pattern and class contingency table."""
+    total = num_positive + num_negative
+    covered = x + y
+    denominator = float(num_positive) * num_negative * covered * \
+            (total - covered)
+    if denominator == 0:
+        return 0.0
+    return total * (x * (num_negative - y) - y * (num_positive - x)) ** 2 / \
+            denominator
+
+
+def upper_bound(score, x, y, num_positive, num_negative):
+    """Bound the score of any pattern containing one found in x positive
+    and y negative trees.
+
+    Such patterns are found in x' <= x positive and y' <= y negative
+    trees.  A convex score over this rectangle is greatest at one of its
+    corners, and the (0, 0) corner scores no higher than the others.
+    """
+    return max(score(x, y, num_positive, num_negative),
+            score(x, 0, num_positive, num_negative),
+            score(0, y, num_positive, num_negative))
+
+
+def optt(forest, classes, k, score=information_gain, max_size=None):
+    """Find the k subtrees that best separate two classes of trees.
+
+    forest is a tree.Forest and classes gives, for each of its trees,
+    True for a positive tree and False for a negative one.  Subtrees are
+    ranked by score, a function of the number of positive and negative
+    trees they occur in, which must be convex for the search to be
+    exact.  information_gain, gini and chi_square are provided.
+
+    This is the optimized pattern search of Abe et al.  Subtrees are
+    enumerated depth first by right most expansion.  A subtree's
+    expansions are only explored when the upper bound on their score
+    could still place one of them among the best k found so far.
+
+    Returns a list of (score, build string, rmos) tuples sorted by
+    decreasing score.  Subtrees larger than max_size are not explored.
+    """
+
+    data = forest.get_compact_tree()
+    num_positive = len([c for c in classes if c])
+    num_negative = len(classes) - num_positive
+    assert len(classes) == data.get_num_trees(), \
+            "Every tree must have a class.\n"
+    if k <= 0:
+        return []
+
+    def evaluate(subtree, rmos):
+        """Return the score and upper bound of a subtree."""
+        x = 0
+        y = 0
+        for tree_id in data.get_occurring_trees(rmos):
+            if classes[tree_id]:
+                x += 1
+            else:
+                y += 1
+        return (score(x, y, num_positive, num_negative),
+                upper_bound(score, x, y, num_positive, num_negative))
+
+    # Min heap of the best k (score, sequence, subtree, rmos) found
+    best = []
+
+    def threshold():
+        """Score that a subtree must beat to enter the best k."""
+        if len(best) < k:
+            return None
+        return best[0][0]
+
+    # Stack of generators of the expansions still to visit at each
+    # size along the current path
+    work_list = [iter(freqt.get_c1(data, 0).items())]
+    while work_list:
+        expansion = next(work_list[-1], None)
+        if expansion is None:
+            work_list.pop()
+            continue
+
+        (subtree, rmos) = expansion
+        (subtree_score, bound) = evaluate(subtree, rmos)
+        entry = (subtree_score, subtree.get_sequence(), subtree, rmos)
+        if len(best) < k:
+            heapq.heappush(best, entry)
+        elif entry[:2] > best[0][:2]:
+            heapq.heapreplace(best, entry)
+
+        # Branch and bound on the expansions of subtree
+        if threshold() is not None and bound <= threshold():
+            continue
+        if max_size is None or subtree.get_size() < max_size:
+            work_list.append(freqt.expand_subtree(data, subtree, rmos, 0,
+                None))
+
+    label_dictionary = data.get_label_dictionary()
+    best.sort(reverse=True)
+    return [(subtree_score, subtree.get_build_string(label_dictionary), rmos)
+            for (subtree_score, sequence, subtree, rmos) in best]
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2009, Regents of the University of California
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#
+#     * Neither the name of the University of California, Los Angeles
+#     nor the names of its contributors may be used to endorse or
+#     promote products derived from this software without specific prior
+#     written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Author: Roy Shea
+# Date: June 2009
+
+import multiprocessing
+import freqt
+import tree
+
+# Read only state shared with worker processes.  It is set by
+# _init_worker, which on platforms that fork is inherited by each
+# worker rather than copied through a pipe.
+_worker_state = None
+
+def _init_worker(data, threshold, token_space, max_size):
+    """Store the mining state in a worker process."""
+    global _worker_state
+    _worker_state = (data, threshold, token_space, max_size)
+
+
+def _mine_subtree(task):
+    """Find every frequent expansion of one subtree depth first.
+
+    task is the (depth, label) sequence of a subtree and its rmos.  The
+    expansions are returned as a list of (sequence, rmos) pairs, not
+    including the subtree itself.
+    """
+    (data, threshold, token_space, max_size) = _worker_state
+    (sequence, rmos) = task
+    start = {freqt.Pattern.from_sequence(sequence): rmos}
+    found = freqt._iter_depth_first(data, start, threshold, token_space,
+            max_size)
+    next(found)
+    return [(subtree.get_sequence(), rmo_new) for (subtree, rmo_new) in found]
+
+
+def parallel_freqt(t, minsup, processes=None, max_size=None,
+        tasks_per_process=4):
+    """Find subtrees induced on t with at least minsup support using a
+    pool of worker processes.
+
+    The result matches freqt.  The subtrees that root independent parts
+    of the right most expansion tree are mined depth first by separate
+    processes.  The smaller sizes are first expanded level wise here
+    until there are at least tasks_per_process subtrees per process.
+    Workers then take subtrees from a shared queue, largest number of
+    occurrences first, so that a worker finishing early picks up the
+    remaining work rather than waiting on a skewed subtree.  Results are
+    merged by size, so the output does not depend on scheduling.
+    """
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    t.lock_tree()
+    data = t.get_compact_tree()
+    threshold = minsup * data.get_support_base()
+    frontier = freqt.get_c1(data, minsup)
+    token_space = [pattern.label for pattern in frontier.keys()]
+
+    found = []
+    while frontier and len(frontier) < processes * tasks_per_process and \
+            (max_size is None or frontier.keys()[0].get_size() < max_size):
+        found += frontier.items()
+        frontier = freqt.expand_trees(data, frontier, minsup, token_space)
+    found += frontier.items()
+
+    tasks = [(subtree.get_sequence(), rmos) for (subtree, rmos) in
+            sorted(frontier.items(), key=lambda item: -len(item[1]))]
+    if max_size is not None:
+        tasks = [task for task in tasks if len(task[0]) < max_size]
+
+    if processes > 1 and len(tasks) > 1:
+        # Build the lazy NumPy index before forking, so that workers
+        # share one copy instead of each building its own
+        if tree.numpy is not None and isinstance(data, tree.CompactTree):
+            data._get_numpy_index()
+            if isinstance(data, tree.Forest) and data.numpy_tree_ids is None:
+                data.numpy_tree_ids = tree.as_numpy_array(data.tree_ids)
+        pool = multiprocessing.Pool(processes, _init_worker,
+                (data, threshold, token_space, max_size))
+        try:
+            for expansions in pool.imap_unordered(_mine_subtree, tasks):
+                found += expansions
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        _init_worker(data, threshold, token_space, max_size)
+        for task in tasks:
+            found += _mine_subtree(task)
+
+    # Merge into the same structure freqt returns
+    label_dictionary = data.get_label_dictionary()
+    frequent_subtrees = {1: {}}
+    for (subtree, rmos) in found:
+        if not isinstance(subtree, freqt.Pattern):
+            subtree = freqt.Pattern.from_sequence(subtree)
+        subtree_string = subtree.get_build_string(label_dictionary)
+        frequent_subtrees.setdefault(subtree.get_size(), {})[subtree_string] = rmos
+    if frequent_subtrees[1]:
+        frequent_subtrees[len(frequent_subtrees) + 1] = {}
+    return frequent_subtrees
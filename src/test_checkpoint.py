@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2009, Regents of the University of California
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#
+#     * Neither the name of the University of California, Los Angeles
+#     nor the names of its contributors may be used to endorse or
+#     promote products derived from this software without specific prior
+#     written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Author: Roy Shea
+# Date: June 2009
+
+import unittest
+import os
+import random
+import shutil
+import tempfile
+import tree
+import freqt
+import checkpoint
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "mining.ckpt")
+
+        # Random tree with a skewed shape
+        generator = random.Random(5)
+        builder = tree.CompactTreeBuilder()
+        builder.push("root")
+        for i in range(300):
+            if len(builder.open_nodes) > 1 and generator.random() < 0.4:
+                builder.pop()
+            else:
+                builder.push(generator.choice("aab"))
+        self.compact = builder.finish()
+        self.minsup = 0.05
+        self.expected = freqt.freqt(self.compact, self.minsup)
+
+
+    def tearDown(self):
+
+        shutil.rmtree(self.directory)
+
+
+    def assertSameResults(self, found, expected):
+
+        self.assertEqual(sorted(found.keys()), sorted(expected.keys()))
+        for (size, subtrees) in expected.items():
+            self.assertEqual(sorted(found[size].keys()), sorted(subtrees.keys()))
+            for (subtree, rmos) in subtrees.items():
+                self.assertEqual(list(found[size][subtree]), list(rmos))
+
+
+    def test_checkpointed_freqt(self):
+
+        found = checkpoint.checkpointed_freqt(self.compact, self.minsup,
+                self.filename)
+        self.assertSameResults(found, self.expected)
+
+        # A finished checkpoint is returned without further mining
+        budget = freqt.Budget()
+        found = checkpoint.checkpointed_freqt(self.compact, self.minsup,
+                self.filename, budget=budget)
+        self.assertSameResults(found, self.expected)
+        self.assertEqual(budget.candidates, 0)
+
+
+    def test_resume(self):
+
+        # Keep resuming with small budgets until mining completes
+        runs = 0
+        while True:
+            runs += 1
+            budget = freqt.Budget(max_candidates=20)
+            found = checkpoint.checkpointed_freqt(self.compact, self.minsup,
+                    self.filename, budget=budget, interval=0)
+            if not budget.exhausted:
+                break
+            self.assertFalse(found[max(found.keys())] == {})
+            self.assertTrue(runs < 1000)
+        self.assertTrue(runs > 1)
+        self.assertSameResults(found, self.expected)
+
+
+    def test_deepen(self):
+
+        found = checkpoint.checkpointed_freqt(self.compact, self.minsup,
+                self.filename, max_size=2)
+        self.assertEqual(sorted(found.keys()), [1, 2])
+        for size in [1, 2]:
+            self.assertEqual(sorted(found[size].keys()),
+                    sorted(self.expected[size].keys()))
+
+        # Going deeper only expands the subtrees of the last size
+        budget = freqt.Budget()
+        found = checkpoint.checkpointed_freqt(self.compact, self.minsup,
+                self.filename, budget=budget)
+        self.assertSameResults(found, self.expected)
+        fresh = freqt.Budget()
+        freqt.freqt(self.compact, self.minsup, budget=fresh)
+        self.assertTrue(budget.candidates < fresh.candidates)
+
+
+    def test_mismatch(self):
+
+        checkpoint.checkpointed_freqt(self.compact, self.minsup,
+                self.filename, max_size=2)
+        self.assertRaises(AssertionError, checkpoint.checkpointed_freqt,
+                self.compact, 0.1, self.filename)
+        other = tree.CompactTree.unrooted_build_tree_from_string(
+                "root a -1 b -1 -1")
+        self.assertRaises(AssertionError, checkpoint.checkpointed_freqt,
+                other, self.minsup, self.filename)
+        compressed = tree.CompressedTree.build_tree_from_string("a -1",
+                "root")
+        self.assertRaises(AssertionError, checkpoint.checkpointed_freqt,
+                compressed, self.minsup, self.filename)
+
+        # Trees with nodes without a state can be checkpointed
+        os.remove(self.filename)
+        label_dictionary = tree.LabelDictionary()
+        label_dictionary.get_label(None)
+        other = tree.CompactTree.build_tree_from_string("a -1 a -1", "root",
+                label_dictionary)
+        found = checkpoint.checkpointed_freqt(other, 0.4, self.filename)
+        self.assertEqual(found[1].keys(), ["a -1"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -37,6 +37,8 @@
 # Date: June 2009
 
 import unittest
+import random
+import threading
 import tree
 import freqt
 
@@ -49,10 +51,18 @@ class TestFreqt(unittest.TestCase):
         self.root = tree.OrderedTreeNode.unrooted_build_tree_from_string(self.tree_string)
         self.root.lock_tree()
 
-        # Build strings for subtrees
-        self.subtree_1_str = "1 -1"
-        self.subtree_2_str = "2 -1"
-        self.subtree_r_str = "root -1"
+        # Labels assigned to the states of the tree.  No node in the
+        # tree has label_3.
+        label_dictionary = self.root.get_label_dictionary()
+        self.label_1 = label_dictionary.find_label('1')
+        self.label_2 = label_dictionary.find_label('2')
+        self.label_r = label_dictionary.find_label("root")
+        self.label_3 = len(label_dictionary)
+
+        # Patterns for subtrees
+        self.subtree_1 = freqt.Pattern(self.label_1)
+        self.subtree_2 = freqt.Pattern(self.label_2)
+        self.subtree_r = freqt.Pattern(self.label_r)
 
 
     def test_get_c1(self):
@@ -60,46 +70,73 @@ class TestFreqt(unittest.TestCase):
         c1 = freqt.get_c1(self.root, 0.05)
         self.assertEqual(len(c1), 3)
 
-        self.assertTrue(self.subtree_1_str in c1.keys())
-        self.assertEqual(len(c1[self.subtree_1_str]), 6)
+        self.assertTrue(self.subtree_1 in c1.keys())
+        self.assertEqual(len(c1[self.subtree_1]), 6)
 
-        self.assertTrue(self.subtree_2_str in c1.keys())
-        self.assertEqual(len(c1[self.subtree_2_str]), 3)
+        self.assertTrue(self.subtree_2 in c1.keys())
+        self.assertEqual(len(c1[self.subtree_2]), 3)
 
-        self.assertTrue(self.subtree_r_str in c1.keys())
-        self.assertEqual(len(c1[self.subtree_r_str]), 1)
+        self.assertTrue(self.subtree_r in c1.keys())
+        self.assertEqual(len(c1[self.subtree_r]), 1)
 
         c1 = freqt.get_c1(self.root, 0.15)
         self.assertEqual(len(c1), 2)
 
-        self.assertTrue(self.subtree_1_str in c1.keys())
-        self.assertTrue(self.subtree_2_str in c1.keys())
+        self.assertTrue(self.subtree_1 in c1.keys())
+        self.assertTrue(self.subtree_2 in c1.keys())
 
         c1 = freqt.get_c1(self.root, 0.8)
         self.assertEqual(len(c1), 0)
 
 
+    def test_pattern(self):
+
+        label_dictionary = self.root.get_label_dictionary()
+        pattern = freqt.Pattern.from_build_string(self.tree_string,
+                label_dictionary)
+        self.assertEqual(pattern.get_size(), 10)
+        self.assertEqual(pattern.get_rml_depth(), 2)
+        self.assertEqual(pattern.get_build_string(label_dictionary),
+                self.tree_string)
+        self.assertEqual(freqt.Pattern.from_sequence(pattern.get_sequence()),
+                pattern)
+        self.assertNotEqual(pattern.prefix, pattern)
+
+        self.assertRaises(AssertionError, freqt.Pattern.from_build_string,
+                "1 -1 -1", label_dictionary)
+        self.assertRaises(AssertionError, freqt.Pattern.from_build_string,
+                "1 -1 2 -1", label_dictionary)
+
+
     def test_pl_expand(self):
 
-        self.root.unlock_tree()
+        label_dictionary = self.root.get_label_dictionary()
+        pattern = freqt.Pattern.from_build_string(self.tree_string,
+                label_dictionary)
+        label_3 = label_dictionary.get_label('3')
+        prefix = "root 1 1 -1 2 -1 1 -1 2 -1 -1 1 1 -1 1 -1 2"
+
+        tree0 = freqt.pl_expand(pattern, 0, label_3)
+        self.assertEqual(tree0.get_size(), 11)
+        self.assertEqual(tree0.get_rml_depth(), 3)
+        self.assertEqual(tree0.get_build_string(label_dictionary),
+                prefix + " 3 -1 -1 -1 -1")
 
-        tree0 = freqt.pl_expand(self.tree_string, 0, 3)
-        tree0.lock_tree()
-        self.assertEqual(tree0.get_num_nodes(), 11)
-        self.assertEqual(tree0.get_nodes()[10].state, '3')
-        self.assertEqual(tree0.get_nodes()[10].get_parent().state, '2')
+        tree1 = freqt.pl_expand(pattern, 1, label_3)
+        self.assertEqual(tree1.get_size(), 11)
+        self.assertEqual(tree1.get_rml_depth(), 2)
+        self.assertEqual(tree1.get_build_string(label_dictionary),
+                prefix + " -1 3 -1 -1 -1")
 
-        tree1 = freqt.pl_expand(self.tree_string, 1, 3)
-        tree1.lock_tree()
-        self.assertEqual(tree1.get_num_nodes(), 11)
-        self.assertEqual(tree1.get_nodes()[10].state, '3')
-        self.assertEqual(tree1.get_nodes()[10].get_parent().state, '1')
+        tree2 = freqt.pl_expand(pattern, 2, label_3)
+        self.assertEqual(tree2.get_size(), 11)
+        self.assertEqual(tree2.get_rml_depth(), 1)
+        self.assertEqual(tree2.get_build_string(label_dictionary),
+                prefix + " -1 -1 3 -1 -1")
 
-        tree2 = freqt.pl_expand(self.tree_string, 2, 3)
-        tree2.lock_tree()
-        self.assertEqual(tree2.get_num_nodes(), 11)
-        self.assertEqual(tree2.get_nodes()[10].state, '3')
-        self.assertEqual(tree2.get_nodes()[10].get_parent().state, "root")
+        # Expansion leaves the original pattern unchanged
+        self.assertEqual(pattern.get_build_string(label_dictionary),
+                self.tree_string)
 
 
     def test_update_rmo(self):
@@ -108,43 +145,43 @@ class TestFreqt(unittest.TestCase):
         c1 = freqt.get_c1(self.root, 0.15)
 
         # Test all possible extensions off of c1.
-        rmo_1 = c1[self.subtree_1_str]
-        rmo_2 = c1[self.subtree_2_str]
+        rmo_1 = c1[self.subtree_1]
+        rmo_2 = c1[self.subtree_2]
 
-        rmo_11 = freqt.update_rmo(self.root, rmo_1, 0, '1')
+        rmo_11 = freqt.update_rmo(self.root, rmo_1, 0, self.label_1)
         self.assertEqual(len(rmo_11), 4)
 
-        rmo_12 = freqt.update_rmo(self.root, rmo_1, 0, '2')
+        rmo_12 = freqt.update_rmo(self.root, rmo_1, 0, self.label_2)
         self.assertEqual(len(rmo_12), 3)
 
-        rmo_13 = freqt.update_rmo(self.root, rmo_1, 0, '3')
+        rmo_13 = freqt.update_rmo(self.root, rmo_1, 0, self.label_3)
         self.assertEqual(len(rmo_13), 0)
 
-        rmo_21 = freqt.update_rmo(self.root, rmo_2, 0, '1')
+        rmo_21 = freqt.update_rmo(self.root, rmo_2, 0, self.label_1)
         self.assertEqual(len(rmo_21), 0)
 
-        rmo_22 = freqt.update_rmo(self.root, rmo_2, 0, '2')
+        rmo_22 = freqt.update_rmo(self.root, rmo_2, 0, self.label_2)
         self.assertEqual(len(rmo_22), 0)
 
-        rmo_23 = freqt.update_rmo(self.root, rmo_2, 0, '3')
+        rmo_23 = freqt.update_rmo(self.root, rmo_2, 0, self.label_3)
         self.assertEqual(len(rmo_23), 0)
 
-        rmo_11 = freqt.update_rmo(self.root, rmo_1, 0, '1')
+        rmo_11 = freqt.update_rmo(self.root, rmo_1, 0, self.label_1)
         self.assertEqual(len(rmo_11), 4)
 
         # Test extensions off of rmo_11.  There should be no p=0
         # extensions, but a few from p=1.
 
-        rmo_111_p0 = freqt.update_rmo(self.root, rmo_11, 0, '1')
+        rmo_111_p0 = freqt.update_rmo(self.root, rmo_11, 0, self.label_1)
         self.assertEqual(len(rmo_111_p0), 0)
 
-        rmo_111_p1 = freqt.update_rmo(self.root, rmo_11, 1, '1')
+        rmo_111_p1 = freqt.update_rmo(self.root, rmo_11, 1, self.label_1)
         self.assertEqual(len(rmo_111_p1), 2)
 
-        rmo_112_p0 = freqt.update_rmo(self.root, rmo_11, 0, '2')
+        rmo_112_p0 = freqt.update_rmo(self.root, rmo_11, 0, self.label_2)
         self.assertEqual(len(rmo_112_p0), 0)
 
-        rmo_112_p1 = freqt.update_rmo(self.root, rmo_11, 1, '2')
+        rmo_112_p1 = freqt.update_rmo(self.root, rmo_11, 1, self.label_2)
         self.assertEqual(len(rmo_112_p1), 3)
 
 
@@ -152,14 +189,15 @@ class TestFreqt(unittest.TestCase):
 
         # c1 = {1:[1, 2, 4, 6, 7, 8], 2:[3, 5, 9]}
         c1 = freqt.get_c1(self.root, 0.15)
+        token_space = [self.label_1, self.label_2, self.label_r]
 
-        c2 = freqt.expand_trees(self.root, c1, 0.15, ['1', '2', 'root'])
+        c2 = freqt.expand_trees(self.root, c1, 0.15, token_space)
         self.assertEqual(len(c2), 2)
 
-        c3 = freqt.expand_trees(self.root, c2, 0.15, ['1', '2', 'root'])
+        c3 = freqt.expand_trees(self.root, c2, 0.15, token_space)
         self.assertEqual(len(c3), 2)
 
-        c3 = freqt.expand_trees(self.root, c2, 0.2, ['1', '2', 'root'])
+        c3 = freqt.expand_trees(self.root, c2, 0.2, token_space)
         self.assertEqual(len(c3), 1)
 
 
@@ -170,6 +208,398 @@ class TestFreqt(unittest.TestCase):
 
         frequent_subtrees = freqt.freqt(self.root, 0.15)
         self.assertEqual(len(frequent_subtrees), 5)
+        self.assertTrue("1 1 -1 -1" in frequent_subtrees[2])
+        self.assertTrue("1 2 -1 -1" in frequent_subtrees[2])
+
+
+    def test_freqt_compact(self):
+
+        compact = tree.CompactTree.unrooted_build_tree_from_string(self.tree_string)
+        expected = freqt.freqt(self.root, 0.15)
+        frequent_subtrees = freqt.freqt(compact.get_root(), 0.15)
+        self.assertEqual(len(frequent_subtrees), len(expected))
+        for size in expected:
+            self.assertEqual(sorted(frequent_subtrees[size].keys()),
+                    sorted(expected[size].keys()))
+            for (subtree, rmos) in expected[size].items():
+                self.assertEqual(len(frequent_subtrees[size][subtree]), len(rmos))
+
+
+    def test_freqt_compressed(self):
+
+        # Repeated subtrees are mined once per distinct subtree
+        generator = random.Random(3)
+        def subtree(depth):
+            children = ""
+            if depth and generator.random() < 0.7:
+                children = " ".join([subtree(depth - 1) for i in
+                    range(generator.randint(1, 3))]) + " "
+            return generator.choice("ab") + " " + children + "-1"
+        blocks = [subtree(3) for i in range(4)]
+        tree_string = " ".join([generator.choice(blocks) for i in range(40)])
+        compressed = tree.CompressedTree.build_tree_from_string(tree_string,
+                "root")
+        compact = compressed.expand()
+        self.assertTrue(compressed.get_num_distinct_subtrees() <
+                compact.get_num_nodes() / 4)
+
+        for minsup in [0.01, 0.05, 0.1]:
+            expected = freqt.freqt(compact, minsup)
+            frequent_subtrees = freqt.freqt(compressed, minsup)
+            self.assertEqual(sorted(frequent_subtrees.keys()),
+                    sorted(expected.keys()))
+            for (size, subtrees) in expected.items():
+                self.assertEqual(sorted(frequent_subtrees[size].keys()),
+                        sorted(subtrees.keys()))
+                for (subtree, rmos) in subtrees.items():
+                    self.assertEqual(list(compressed.get_positions(
+                        frequent_subtrees[size][subtree])), list(rmos))
+
+            supports = sorted([(pattern.get_sequence(), support) for
+                (size, pattern, support, rmos) in
+                freqt.iter_freqt(compact, minsup, True)])
+            self.assertEqual(sorted([(pattern.get_sequence(), support) for
+                (size, pattern, support, rmos) in
+                freqt.iter_freqt(compressed, minsup, True)]), supports)
+
+        # Closed, maximal and incremental mining need a CompactTree
+        for mode in ["closed", "maximal"]:
+            self.assertRaises(AssertionError, freqt.freqt, compressed, 0.1,
+                    mode=mode)
+            self.assertRaises(AssertionError, list,
+                    freqt.iter_freqt(compressed, 0.1, mode=mode))
+        self.assertRaises(AssertionError, freqt.incremental_freqt,
+                compressed, 0.1, freqt.freqt(compressed, 0.1), [("a -1", 0)])
+
+
+    def test_freqt_dfs(self):
+
+        for minsup in [0.05, 0.15, 0.2]:
+            expected = freqt.freqt(self.root, minsup)
+            label_dictionary = self.root.get_label_dictionary()
+            found = {}
+            def callback(size, pattern, support, rmos):
+                self.assertEqual(pattern.get_size(), size)
+                self.assertEqual(support, len(rmos))
+                subtrees = found.setdefault(size, {})
+                subtree = pattern.get_build_string(label_dictionary)
+                self.assertFalse(subtree in subtrees)
+                subtrees[subtree] = list(rmos)
+            freqt.freqt_dfs(self.root, minsup, callback)
+
+            for (size, subtrees) in expected.items():
+                self.assertEqual(found.get(size, {}), dict([(subtree,
+                    list(rmos)) for (subtree, rmos) in subtrees.items()]))
+
+        sizes = []
+        freqt.freqt_dfs(self.root, 0.05, lambda size, pattern, support, rmos:
+                sizes.append(size), max_size=2)
+        self.assertEqual(max(sizes), 2)
+
+
+    def test_iter_freqt(self):
+
+        label_dictionary = self.root.get_label_dictionary()
+        for depth_first in [False, True]:
+            expected = freqt.freqt(self.root, 0.05)
+            found = {}
+            for (size, pattern, support, rmos) in freqt.iter_freqt(self.root,
+                    0.05, depth_first):
+                subtree = pattern.get_build_string(label_dictionary)
+                found.setdefault(size, {})[subtree] = support
+            for (size, subtrees) in expected.items():
+                self.assertEqual(found.get(size, {}), dict([(subtree,
+                    len(rmos)) for (subtree, rmos) in subtrees.items()]))
+
+        # Level wise results arrive in order of size
+        sizes = [size for (size, pattern, support, rmos) in
+                freqt.iter_freqt(self.root, 0.05, max_size=3)]
+        self.assertEqual(sizes, sorted(sizes))
+        self.assertEqual(sizes[-1], 3)
+
+        # Consumers can stop early
+        results = freqt.iter_freqt(self.root, 0.05)
+        first = next(results)
+        self.assertEqual(first[0], 1)
+        results.close()
+
+
+    def test_freqt_forest(self):
+
+        # Many occurrences in one tree count once
+        forest = tree.Forest.from_strings(["a b -1 b -1 b -1 b -1 -1",
+            "a b -1 -1", "a c -1 -1", "c -1"])
+
+        frequent_subtrees = freqt.freqt(forest, 0.4)
+        self.assertEqual(sorted(frequent_subtrees[1].keys()),
+                ["a -1", "b -1", "c -1"])
+        self.assertEqual(frequent_subtrees[2].keys(), ["a b -1 -1"])
+        self.assertEqual(frequent_subtrees[3], {})
+
+        supports = [support for (size, pattern, support, rmos) in
+                freqt.iter_freqt(forest, 0.4) if size == 2]
+        self.assertEqual(supports, [2])
+
+        frequent_subtrees = freqt.freqt(forest, 0.6)
+        self.assertEqual(frequent_subtrees[1].keys(), ["a -1"])
+
+
+    def test_topk_freqt(self):
+
+        # At least as good as freqt with a minsup just below the kth best
+        # support
+        num_nodes = self.root.get_num_nodes()
+        for (k, min_size) in [(1, 1), (3, 1), (4, 2), (5, 3), (50, 1)]:
+            best = freqt.topk_freqt(self.root, k, min_size)
+            minsup = (best[-1][0] - 0.5) / num_nodes
+            supports = []
+            for (size, subtrees) in freqt.freqt(self.root, minsup).items():
+                if size >= min_size:
+                    supports += [len(rmos) for rmos in subtrees.values()]
+            supports.sort(reverse=True)
+            self.assertTrue(len(best) >= min(k, len(supports)))
+            for (found, expected) in zip(best, supports):
+                self.assertTrue(found[0] >= expected)
+            for (support, subtree, rmos) in best:
+                self.assertEqual(support, len(rmos))
+                self.assertTrue(len(subtree.split()) / 2 >= min_size)
+
+        best = freqt.topk_freqt(self.root, 2)
+        self.assertEqual(best[0][1], "1 -1")
+        self.assertEqual(best[1][1], "1 1 -1 -1")
+
+        best = freqt.topk_freqt(self.root, 10, max_size=1)
+        self.assertEqual(len(best), 3)
+
+        # Support in a forest only drops as subtrees grow, so the top k
+        # are exact
+        forest = tree.Forest.from_strings(["a b -1 b -1 -1", "a b c -1 -1 -1",
+            "a c -1 -1", "b c -1 -1", "a b -1 -1"])
+        everything = []
+        for (size, subtrees) in freqt.freqt(forest, 0).items():
+            if size >= 2:
+                everything += [forest.count_support(rmos) for rmos in
+                        subtrees.values()]
+        everything.sort(reverse=True)
+        best = freqt.topk_freqt(forest, 3, 2)
+        self.assertEqual([support for (support, subtree, rmos) in best],
+                everything[:3])
+        self.assertEqual(best[0][1], "a b -1 -1")
+        self.assertEqual(freqt.topk_freqt(forest, 0), [])
+
+
+    def test_closed_freqt(self):
+
+        forest = tree.Forest.from_strings(["a b c -1 -1 -1", "a b c -1 -1 -1",
+            "a b -1 -1"])
+        closed = freqt.freqt(forest, 0.5, mode="closed")
+        self.assertEqual(closed[1], {})
+        self.assertEqual(closed[2].keys(), ["a b -1 -1"])
+        self.assertEqual(closed[3].keys(), ["a b c -1 -1 -1"])
+        maximal = freqt.freqt(forest, 0.5, mode="maximal")
+        self.assertEqual(maximal[2], {})
+        self.assertEqual(maximal[3].keys(), ["a b c -1 -1 -1"])
+
+        # Closed subtrees are a subset of the frequent ones, with the same
+        # supports, and maximal subtrees are closed
+        label_dictionary = self.root.get_label_dictionary()
+        def mine(mode, depth_first):
+            return dict([(pattern.get_build_string(label_dictionary),
+                support) for (size, pattern, support, rmos) in
+                freqt.iter_freqt(self.root, 0.1, depth_first, mode=mode)])
+        everything = mine("all", False)
+        closed = mine("closed", False)
+        maximal = mine("maximal", False)
+        self.assertEqual(closed, mine("closed", True))
+        self.assertEqual(maximal, mine("maximal", True))
+        self.assertTrue(len(maximal) <= len(closed) < len(everything))
+        for (subtree, support) in closed.items():
+            self.assertEqual(everything[subtree], support)
+        for subtree in maximal.keys():
+            self.assertTrue(subtree in closed)
+
+        # Every occurrence of a larger subtree is below the root, so
+        # placing it below a "root" node keeps its support
+        self.assertEqual(closed, {"1 -1": 6})
+        self.assertEqual(maximal, {})
+
+        # Supertrees may add a node to the left of the right most path
+        forest = tree.Forest.from_strings(["a b -1 c -1 -1"] * 2)
+        closed = freqt.freqt(forest, 0.0, mode="closed")
+        self.assertEqual(closed[2], {})
+        self.assertEqual(closed[3].keys(), ["a b -1 c -1 -1"])
+        maximal = freqt.freqt(forest, 0.0, mode="maximal")
+        self.assertEqual(maximal[2], {})
+        self.assertEqual(maximal[3].keys(), ["a b -1 c -1 -1"])
+
+        # In a single tree "b" comes before both occurrences of "a c"
+        compact = tree.CompactTree.unrooted_build_tree_from_string(
+                "a b -1 c -1 c -1 -1")
+        closed = freqt.freqt(compact, 0.0, mode="closed")
+        self.assertTrue("a c -1 -1" not in closed[2])
+        self.assertEqual(list(closed[3]["a b -1 c -1 -1"]), [2, 3])
+
+        # Leaves may also be added inside the subtrees left of the path
+        forest = tree.Forest.from_strings(["a b d -1 -1 b -1 c -1 -1",
+            "a b -1 b d -1 -1 c -1 -1"])
+        closed = freqt.freqt(forest, 0.0, mode="closed")
+        self.assertTrue("a b -1 c -1 -1" not in closed[3])
+        self.assertTrue("a b d -1 -1 c -1 -1" in closed[4])
+
+    def test_budget(self):
+
+        complete = freqt.freqt(self.root, 0.1)
+        self.assertEqual(complete[max(complete.keys())], {})
+
+        def check_partial(partial):
+            self.assertNotEqual(partial[max(partial.keys())], {})
+            for (size, subtrees) in partial.items():
+                for (subtree, rmos) in subtrees.items():
+                    self.assertEqual(list(rmos), list(complete[size][subtree]))
+
+        budget = freqt.Budget(max_candidates=3)
+        partial = freqt.freqt(self.root, 0.1, budget=budget)
+        self.assertTrue(budget.exhausted)
+        self.assertTrue(budget.candidates > 3)
+        check_partial(partial)
+        self.assertTrue(0 < len(partial[2]) < len(complete[2]) or
+                len(partial) < len(complete))
+
+        budget = freqt.Budget(max_occurrences=12)
+        partial = freqt.freqt(self.root, 0.1, budget=budget)
+        check_partial(partial)
+        self.assertEqual(partial.keys(), [1, 2])
+        self.assertTrue(len(partial[2]) < len(complete[2]))
+        self.assertEqual(sum([len(rmos) for subtrees in partial.values() for
+            rmos in subtrees.values()]), budget.occurrences)
+
+        # Only interrupted results lack a trailing empty size, even
+        # when closed mining finds empty sizes along the way
+        class Countdown(freqt.Budget):
+            def __init__(self, checks):
+                freqt.Budget.__init__(self)
+                self.checks = checks
+            def is_exhausted(self):
+                self.checks -= 1
+                self.exhausted = self.exhausted or self.checks < 0
+                return self.exhausted
+        def check_end(t, minsup, mode, budget):
+            partial = freqt.freqt(t, minsup, mode=mode, budget=budget)
+            if budget.exhausted:
+                self.assertTrue(not partial or
+                        partial[max(partial.keys())] != {})
+            else:
+                self.assertEqual(partial[max(partial.keys())], {})
+        compact = tree.CompactTree.build_tree_from_string(
+                "c -1 b b a -1 -1 -1", "c")
+        partial = freqt.freqt(compact, 0.1, mode="closed",
+                budget=freqt.Budget(max_candidates=9))
+        self.assertEqual(partial.keys(), [1])
+        generator = random.Random(5)
+        for trial in range(150):
+            builder = tree.CompactTreeBuilder()
+            builder.push("root")
+            for i in range(generator.randint(0, 14)):
+                if len(builder.open_nodes) > 1 and generator.random() < 0.4:
+                    builder.pop()
+                else:
+                    builder.push(generator.choice("abc"))
+            compact = builder.finish()
+            mode = generator.choice(["all", "closed", "maximal"])
+            check_end(compact, 0.1, mode,
+                    freqt.Budget(max_candidates=generator.randint(0, 40)))
+            check_end(compact, 0.1, mode, Countdown(generator.randint(0, 8)))
+        for checks in range(12):
+            for mode in ["all", "closed"]:
+                check_end(self.root, 0.1, mode, Countdown(checks))
+
+        # Candidates are charged per child scanned, not per expansion
+        budget = freqt.Budget()
+        freqt.expand_trees(self.root, {self.subtree_1:
+            self.root.get_compact_tree().get_label_occurrences()[self.label_1]},
+            0.0, [self.label_1, self.label_2], budget)
+        self.assertEqual(budget.candidates, 7)
+
+        # An expired deadline still gives the frequent single nodes
+        partial = freqt.freqt(self.root, 0.1, budget=freqt.Budget(0))
+        self.assertEqual(partial.keys(), [1])
+        self.assertEqual(sorted(partial[1].keys()), sorted(complete[1].keys()))
+
+        budget = freqt.Budget(max_candidates=2)
+        closed = freqt.freqt(self.root, 0.1, mode="closed", budget=budget)
+        complete_closed = freqt.freqt(self.root, 0.1, mode="closed")
+        self.assertTrue(budget.exhausted)
+        self.assertTrue(len(closed) < len(complete_closed))
+        for (size, subtrees) in closed.items():
+            for subtree in subtrees.keys():
+                self.assertTrue(subtree in complete_closed[size])
+
+        budget = freqt.Budget(max_occurrences=10)
+        found = list(freqt.iter_freqt(self.root, 0.1, True, budget=budget))
+        self.assertTrue(budget.exhausted)
+        self.assertEqual(sum([len(rmos) for (size, subtree, support, rmos) in
+            found]), budget.occurrences)
+        self.assertTrue(len(found) < 7)
+
+        # Budgets work outside of the main thread
+        results = []
+        worker = threading.Thread(target=lambda: results.append(
+            freqt.freqt(self.root, 0.1, timeout=60)))
+        worker.start()
+        worker.join()
+        self.assertEqual([(size, sorted(subtrees.keys())) for (size, subtrees)
+            in results[0].items()], [(size, sorted(subtrees.keys())) for
+                (size, subtrees) in complete.items()])
+
+
+    def test_incremental_freqt(self):
+
+        generator = random.Random(3)
+        def random_tree_string(num_nodes):
+            tokens = [generator.choice("abc")]
+            depth = 1
+            for i in range(num_nodes):
+                if depth > 1 and generator.random() < 0.4:
+                    tokens.append("-1")
+                    depth -= 1
+                else:
+                    tokens.append(generator.choice("abc"))
+                    depth += 1
+            return " ".join(tokens + ["-1"] * depth)
+
+        def as_lists(result):
+            return dict([(size, dict([(subtree, list(rmos)) for (subtree,
+                rmos) in subtrees.items()])) for (size, subtrees) in
+                result.items()])
+
+        for trial in range(50):
+            minsup = generator.choice([0.05, 0.1, 0.2, 0.4])
+            if trial % 2:
+                tree_strings = [random_tree_string(generator.randint(0, 8))
+                        for i in range(generator.randint(1, 4))]
+                data = tree.Forest.from_strings(tree_strings)
+                grown = tree.Forest.from_strings(tree_strings,
+                        data.get_label_dictionary())
+            else:
+                tree_string = random_tree_string(generator.randint(1, 25))
+                data = tree.CompactTree.unrooted_build_tree_from_string(
+                        tree_string)
+                grown = tree.CompactTree.unrooted_build_tree_from_string(
+                        tree_string, data.get_label_dictionary())
+            previous = freqt.freqt(data, minsup)
+
+            subtrees = []
+            for i in range(generator.randint(1, 3)):
+                parent = generator.choice(list(grown.get_right_most_path()))
+                if trial % 2 and generator.random() < 0.5:
+                    parent = None
+                tree_string = random_tree_string(generator.randint(0, 5))
+                grown.append_subtree(tree_string, parent)
+                subtrees.append((tree_string, parent))
+
+            self.assertEqual(as_lists(freqt.incremental_freqt(data, minsup,
+                previous, subtrees)), as_lists(freqt.freqt(grown, minsup)))
+            self.assertEqual(list(data.ends), list(grown.ends))
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2009, Regents of the University of California
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#
+#     * Neither the name of the University of California, Los Angeles
+#     nor the names of its contributors may be used to endorse or
+#     promote products derived from this software without specific prior
+#     written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Author: Roy Shea
+# Date: June 2009
+
+import unittest
+import random
+import tree
+import freqt
+import optt
+
+class TestOptt(unittest.TestCase):
+
+    def setUp(self):
+
+        # Positive trees contain "a (b c)" while negative trees do not
+        generator = random.Random(3)
+        self.classes = []
+        tree_strings = []
+        for i in range(40):
+            builder = []
+            positive = i % 2 == 0
+            if positive:
+                builder.append("a b -1 c -1 -1")
+            for j in range(generator.randint(1, 4)):
+                builder.append("%s %s -1 -1" % (generator.choice("abc"),
+                    generator.choice("abc")))
+            tree_strings.append("r %s -1" % " ".join(builder))
+            self.classes.append(positive)
+        self.forest = tree.Forest.from_strings(tree_strings)
+
+
+    def exhaustive(self, score, max_size):
+
+        scores = []
+        num_positive = self.classes.count(True)
+        num_negative = self.classes.count(False)
+        for (size, pattern, support, rmos) in freqt.iter_freqt(self.forest,
+                0, True, max_size):
+            trees = self.forest.get_occurring_trees(rmos)
+            x = len([tree_id for tree_id in trees if self.classes[tree_id]])
+            scores.append(score(x, len(trees) - x, num_positive,
+                num_negative))
+        scores.sort(reverse=True)
+        return scores
+
+
+    def test_scores(self):
+
+        for score in [optt.information_gain, optt.gini, optt.chi_square]:
+            # Perfect splits score highest and uninformative ones zero
+            self.assertTrue(score(10, 0, 10, 10) > score(5, 0, 10, 10))
+            self.assertAlmostEqual(score(5, 5, 10, 10), 0.0)
+            self.assertAlmostEqual(score(0, 0, 10, 10), 0.0)
+            self.assertAlmostEqual(score(10, 10, 10, 10), 0.0)
+        self.assertAlmostEqual(optt.information_gain(10, 0, 10, 10), 1.0)
+        self.assertAlmostEqual(optt.gini(10, 0, 10, 10), 0.5)
+        self.assertAlmostEqual(optt.chi_square(10, 0, 10, 10), 20.0)
+
+
+    def test_upper_bound(self):
+
+        for score in [optt.information_gain, optt.gini, optt.chi_square]:
+            for (x, y) in [(3, 7), (10, 2), (0, 4), (6, 6)]:
+                bound = optt.upper_bound(score, x, y, 10, 10)
+                for xx in range(x + 1):
+                    for yy in range(y + 1):
+                        self.assertTrue(score(xx, yy, 10, 10) <= bound + 1e-12)
+
+
+    def test_optt(self):
+
+        for score in [optt.information_gain, optt.gini, optt.chi_square]:
+            expected = self.exhaustive(score, 4)
+            best = optt.optt(self.forest, self.classes, 5, score, 4)
+            self.assertEqual(len(best), 5)
+            for (found, wanted) in zip([entry[0] for entry in best],
+                    expected[:5]):
+                self.assertAlmostEqual(found, wanted)
+
+        # The planted pattern separates the classes perfectly
+        best = optt.optt(self.forest, self.classes, 1)
+        self.assertAlmostEqual(best[0][0], 1.0)
+        self.assertTrue("a b -1 c -1 -1" in best[0][1])
+        self.assertEqual(optt.optt(self.forest, self.classes, 0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
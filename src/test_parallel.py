@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2009, Regents of the University of California
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#
+#     * Neither the name of the University of California, Los Angeles
+#     nor the names of its contributors may be used to endorse or
+#     promote products derived from this software without specific prior
+#     written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Author: Roy Shea
+# Date: June 2009
+
+import unittest
+import random
+import tree
+import freqt
+import parallel
+
+class TestParallel(unittest.TestCase):
+
+    def setUp(self):
+
+        # Tree used throughout the tests
+        self.tree_string = "root 1 1 -1 2 -1 1 -1 2 -1 -1 1 1 -1 1 -1 2 -1 -1 -1"
+        self.root = tree.OrderedTreeNode.unrooted_build_tree_from_string(self.tree_string)
+        self.root.lock_tree()
+
+        # Larger random tree with a skewed shape
+        generator = random.Random(11)
+        builder = tree.CompactTreeBuilder()
+        builder.push("root")
+        for i in range(600):
+            if len(builder.open_nodes) > 1 and generator.random() < 0.4:
+                builder.pop()
+            else:
+                builder.push(generator.choice("aab"))
+        self.compact = builder.finish()
+
+
+    def assertSameResults(self, found, expected):
+
+        self.assertEqual(sorted(found.keys()), sorted(expected.keys()))
+        for (size, subtrees) in expected.items():
+            self.assertEqual(sorted(found[size].keys()), sorted(subtrees.keys()))
+            for (subtree, rmos) in subtrees.items():
+                self.assertEqual(list(found[size][subtree]), list(rmos))
+
+
+    def test_parallel_freqt(self):
+
+        for minsup in [0.05, 0.15, 0.2, 0.9]:
+            expected = freqt.freqt(self.root, minsup)
+            for processes in [1, 2]:
+                found = parallel.parallel_freqt(self.root, minsup, processes)
+                self.assertSameResults(found, expected)
+
+
+    def test_parallel_freqt_skewed(self):
+
+        expected = freqt.freqt(self.compact, 0.02)
+        self.assertTrue(len(expected) > 4)
+        found = parallel.parallel_freqt(self.compact, 0.02, 3,
+                tasks_per_process=1)
+        self.assertSameResults(found, expected)
+
+
+    def test_compressed(self):
+
+        compressed = tree.CompressedTree.from_tree(self.compact.get_root())
+        expected = freqt.freqt(compressed, 0.05)
+        found = parallel.parallel_freqt(compressed, 0.05, 2,
+                tasks_per_process=1)
+        self.assertSameResults(found, expected)
+
+
+    def test_max_size(self):
+
+        found = parallel.parallel_freqt(self.compact, 0.02, 2, max_size=3)
+        self.assertEqual(max([size for size in found if found[size]]), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -37,6 +37,7 @@
 # Date: June 2009
 
 import unittest
+import random
 import tree
 
 class TestTree(unittest.TestCase):
@@ -189,6 +190,26 @@ class TestTree(unittest.TestCase):
         self.assertRaises(IndexError, self.node4.get_pth_parent, 3)
 
 
+    def test_get_pth_parent_unlocked(self):
+
+        self.assertEqual(self.node4.get_pth_parent(0), self.node4)
+        self.assertEqual(self.node4.get_pth_parent(2), self.root)
+        self.assertRaises(IndexError, self.node4.get_pth_parent, 3)
+
+
+    def test_get_pth_parent_deep(self):
+
+        local_root = tree.TreeNode("0")
+        node = local_root
+        for depth in range(1, 5000):
+            node = node.append_child(str(depth))
+        local_root.lock_tree()
+        self.assertEqual(node.get_pth_parent(10).state, "4989")
+        self.assertEqual(node.get_pth_parent(4999), local_root)
+        self.assertEqual(node.get_root(), local_root)
+        self.assertRaises(IndexError, node.get_pth_parent, 5000)
+
+
     def test_get_depth(self):
 
         self.assertRaises(AssertionError, self.root.get_tree_position)
@@ -222,6 +243,48 @@ class TestTree(unittest.TestCase):
         self.assertEqual(len(nodes), 6)
 
 
+    def test_labels(self):
+
+        self.root.lock_tree()
+        label_dictionary = self.root.get_label_dictionary()
+        self.assertEqual(len(label_dictionary), 6)
+        self.assertEqual(label_dictionary.get_state(self.node4.label), '4')
+        self.assertEqual(label_dictionary.find_label('4'), self.node4.label)
+        self.assertEqual(label_dictionary.find_label('6'), None)
+
+        # Labels are kept stable when the tree is relocked
+        self.root.unlock_tree()
+        self.node5.append_child('4')
+        self.root.lock_tree()
+        self.assertEqual(self.root.get_label_dictionary(), label_dictionary)
+        self.assertEqual(self.node5.get_children()[0].label, self.node4.label)
+
+        # Nodes without a state share a label with their compact form
+        root = tree.TreeNode()
+        root.build_tree_from_string("a -1 b -1")
+        root.lock_tree()
+        compact = root.get_compact_tree()
+        self.assertEqual(list(compact.labels),
+                [node.label for node in root.get_nodes()])
+        self.assertEqual(root.get_label_dictionary().states,
+                ["None", "a", "b"])
+
+
+    def test_is_descendant_of(self):
+
+        self.root.lock_tree()
+        self.assertTrue(self.node4.is_descendant_of(self.root))
+        self.assertTrue(self.node4.is_descendant_of(self.node3))
+        self.assertFalse(self.node4.is_descendant_of(self.node4))
+        self.assertFalse(self.node4.is_descendant_of(self.node5))
+        self.assertFalse(self.root.is_descendant_of(self.node3))
+
+        nodes = self.node4.get_nodes()
+        self.assertEqual([node.state for node in nodes], ['4', '2', '1'])
+        for node in nodes[1:]:
+            self.assertTrue(node.is_descendant_of(self.node4))
+
+
 class OrderedTestTree(unittest.TestCase):
 
     def setUp(self):
@@ -310,6 +373,30 @@ class OrderedTestTree(unittest.TestCase):
         r2.build_tree_from_string(tree_string)
         self.assertTrue(r1.structural_equality(r2))
 
+        # Nodes of a locked tree compare subtree ids
+        r1.lock_tree()
+        r2.lock_tree(r1.label_dictionary)
+        self.assertTrue(r1.structural_equality(r2))
+        r3 = tree.OrderedTreeNode.unrooted_build_tree_from_string(
+                "root 3 4 1 -1 2 -1 -1 5 -1 -1 -1")
+        r3.lock_tree(r1.label_dictionary)
+        self.assertFalse(r1.structural_equality(r3))
+        self.assertTrue(r1.get_children()[0].get_children()[1].structural_equality(
+            r3.get_children()[0].get_children()[1]))
+        r4 = tree.OrderedTreeNode.unrooted_build_tree_from_string(
+                "root 3 -1 4 2 -1 -1 3 -1 -1")
+        r4.lock_tree()
+        (first, second, third) = r4.get_children()
+        self.assertTrue(first.structural_equality(third))
+        self.assertEqual(first.get_subtree_id(), third.get_subtree_id())
+        self.assertFalse(first.structural_equality(second))
+        r2.unlock_tree()
+        self.assertTrue(r1.structural_equality(r2))
+        self.assertRaises(AssertionError, r2.get_subtree_id)
+
+        # Locking does not add subtrees to the shared dictionary
+        self.assertEqual(len(r1.label_dictionary.subtrees), 0)
+
 
     def test_build_string_from_tree(self):
 
@@ -317,6 +404,57 @@ class OrderedTestTree(unittest.TestCase):
         self.assertEqual(self.root.build_string_from_tree(), build_string)
 
 
+    def test_append_subtree(self):
+
+        def check(root, build_string):
+            expected = tree.OrderedTreeNode.unrooted_build_tree_from_string(
+                    build_string)
+            expected.lock_tree()
+            self.assertEqual(root.build_string_from_tree(), build_string)
+            nodes = root.get_nodes()
+            self.assertEqual([(node.position, node.end, node.depth,
+                node.label_dictionary.get_state(node.label), node.locked)
+                for node in nodes], [(node.position, node.end, node.depth,
+                    node.state, True) for node in expected.get_nodes()])
+            self.assertEqual(root.levels, expected.levels)
+            for node in nodes:
+                for p in range(node.depth + 1):
+                    self.assertEqual(node.get_pth_parent(p).position,
+                            expected.get_nodes()[node.position].get_pth_parent(
+                                p).position)
+            compact = root.get_compact_tree()
+            self.assertEqual(compact.get_root().build_string_from_tree(),
+                    build_string)
+            self.assertEqual(list(compact.ends),
+                    [node.end for node in nodes])
+            self.assertEqual(list(compact.get_subtree_ids()),
+                    [node.get_subtree_id() for node in nodes])
+            for node in nodes:
+                for other in nodes:
+                    self.assertEqual(node.get_subtree_id() ==
+                            other.get_subtree_id(),
+                            node.build_string_from_tree() ==
+                            other.build_string_from_tree())
+
+        self.root.lock_tree()
+        compact = self.root.get_compact_tree()
+        self.node5.append_subtree("6 7 -1 -1 8 -1")
+        self.assertTrue(self.root.locked)
+        self.assertTrue(self.root.get_compact_tree() is compact)
+        check(self.root, "root 3 4 2 -1 1 -1 -1 5 6 7 -1 -1 8 -1 -1 -1 -1")
+
+        self.assertRaises(AssertionError, self.root.append_subtree, "9 -1 -1")
+        self.root.append_subtree("9 -1")
+        check(self.root,
+                "root 3 4 2 -1 1 -1 -1 5 6 7 -1 -1 8 -1 -1 -1 9 -1 -1")
+
+        # Appending off the right most path relocks the tree
+        self.node4.append_subtree("10 -1")
+        self.assertTrue(self.node4.locked)
+        check(self.root,
+                "root 3 4 2 -1 1 -1 10 -1 -1 5 6 7 -1 -1 8 -1 -1 -1 9 -1 -1")
+
+
     def test_unrooted_build_tree_from_string(self):
 
         tree_string = "3 4 2 -1 1 -1 -1 5 -1 -1"
@@ -332,5 +470,367 @@ class OrderedTestTree(unittest.TestCase):
                 tree_string)
 
 
+class CompactTreeTest(unittest.TestCase):
+
+    def setUp(self):
+
+        tree_string = "3 4 2 -1 1 -1 -1 5 -1 -1"
+        self.compact = tree.CompactTree.build_tree_from_string(tree_string,
+                "root")
+        self.root = self.compact.get_root()
+        self.node3 = self.root.get_children()[0]
+        self.node4 = self.node3.get_children()[0]
+        self.node5 = self.node3.get_children()[1]
+
+
+    def test_arrays(self):
+
+        self.assertEqual(self.compact.get_num_nodes(), 6)
+        states = [self.compact.get_state(i) for i in range(6)]
+        self.assertEqual(states, ["root", '3', '4', '2', '1', '5'])
+        self.assertEqual(list(self.compact.parents), [-1, 0, 1, 2, 2, 1])
+        self.assertEqual(list(self.compact.depths), [0, 1, 2, 3, 3, 2])
+        self.assertEqual(list(self.compact.ends), [6, 6, 5, 4, 5, 6])
+
+
+    def test_from_tree(self):
+
+        root = tree.OrderedTreeNode("root")
+        root.build_tree_from_string("3 4 2 -1 1 -1 -1 5 -1 -1")
+        compact = tree.CompactTree.from_tree(root)
+        self.assertEqual(list(compact.labels), list(self.compact.labels))
+        self.assertEqual(list(compact.ends), list(self.compact.ends))
+        self.assertEqual(compact.get_root().build_string_from_tree(),
+                root.build_string_from_tree())
+
+
+    def test_unrooted_build_tree_from_string(self):
+
+        tree_string = "3 4 2 -1 1 -1 -1 5 -1 -1"
+        compact = tree.CompactTree.unrooted_build_tree_from_string(tree_string)
+        self.assertEqual(compact.get_num_nodes(), 5)
+        self.assertEqual(compact.get_root().get_num_children(), 2)
+
+        tree_string = "3 -1 -1"
+        self.assertRaises(AssertionError,
+                tree.CompactTree.unrooted_build_tree_from_string, tree_string)
+
+
+    def test_get_children(self):
+
+        self.assertEqual(self.root.get_children(), [self.node3])
+        self.assertEqual([c.state for c in self.node3.get_children()],
+                ['4', '5'])
+        self.assertEqual([c.state for c in self.node4.get_children()],
+                ['2', '1'])
+        self.assertEqual(self.node5.get_children(), [])
+
+
+    def test_get_parent(self):
+
+        self.assertEqual(self.root.get_parent(), None)
+        self.assertEqual(self.node4.get_parent(), self.node3)
+        self.assertEqual(self.node3.get_parent(), self.root)
+
+
+    def test_get_pth_parent(self):
+
+        self.assertEqual(self.root.get_pth_parent(0), self.root)
+        self.assertRaises(IndexError, self.root.get_pth_parent, 1)
+        self.assertEqual(self.node4.get_pth_parent(1), self.node3)
+        self.assertEqual(self.node4.get_pth_parent(2), self.root)
+        self.assertRaises(IndexError, self.node4.get_pth_parent, 3)
+
+
+    def test_get_depth(self):
+
+        self.assertEqual(self.root.get_depth(), 0)
+        self.assertEqual(self.node3.get_depth(), 1)
+        self.assertEqual(self.node4.get_depth(), 2)
+
+
+    def test_get_nodes(self):
+
+        self.assertEqual(self.root.get_num_nodes(), 6)
+        self.assertEqual(self.node3.get_num_nodes(), 5)
+        self.assertEqual(self.node4.get_num_nodes(), 3)
+        states = [node.state for node in self.root.get_nodes()]
+        self.assertEqual(states, ["root", '3', '4', '2', '1', '5'])
+        self.assertEqual(self.node5.get_tree_position(), 5)
+
+
+    def test_is_descendant_of(self):
+
+        self.assertTrue(self.node4.is_descendant_of(self.root))
+        self.assertFalse(self.node4.is_descendant_of(self.node5))
+        self.assertFalse(self.node3.is_descendant_of(self.node3))
+
+
+    def test_get_right_most_leaf(self):
+
+        self.assertEqual(self.root.get_right_most_leaf().state, '5')
+        self.assertEqual(self.node4.get_right_most_leaf().state, '1')
+
+
+    def test_build_string_from_tree(self):
+
+        build_string = "root 3 4 2 -1 1 -1 -1 5 -1 -1 -1"
+        self.assertEqual(self.root.build_string_from_tree(), build_string)
+        self.assertEqual(self.node4.build_string_from_tree(), "4 2 -1 1 -1 -1")
+
+
+    def test_shared_label_dictionary(self):
+
+        label_dictionary = self.compact.get_label_dictionary()
+        other = tree.CompactTree.unrooted_build_tree_from_string("5 6 -1 -1",
+                label_dictionary)
+        self.assertEqual(other.labels[0], self.node5.label)
+        self.assertEqual(other.get_state(1), '6')
+        self.assertEqual(len(label_dictionary), 7)
+
+
+    def test_get_label_occurrences(self):
+
+        occurrences = self.compact.get_label_occurrences()
+        self.assertEqual(len(occurrences), 6)
+        self.assertEqual(list(occurrences[self.node4.label]), [2])
+
+        compact = tree.CompactTree.build_tree_from_string(
+                "1 1 -1 2 -1 1 -1 -1 1 -1", "root")
+        occurrences = compact.get_label_occurrences()
+        label_1 = compact.get_label_dictionary().find_label('1')
+        self.assertEqual(list(occurrences[label_1]), [1, 2, 4, 5])
+
+
+    def test_expand_occurrences(self):
+
+        # Compare against expanding one view at a time
+        generator = random.Random(5)
+        builder = tree.CompactTreeBuilder()
+        builder.push("root")
+        for i in range(400):
+            if len(builder.open_nodes) > 1 and generator.random() < 0.45:
+                builder.pop()
+            else:
+                builder.push(generator.choice("abc"))
+        compact = builder.finish()
+        label_dictionary = compact.get_label_dictionary()
+
+        for p in range(3):
+            rmos = [position for position in range(compact.get_num_nodes())
+                    if compact.depths[position] >= p and
+                    generator.random() < 0.5]
+            for l in range(len(label_dictionary)):
+                expected = set()
+                for rmo in rmos:
+                    node = compact.get_node(rmo)
+                    if p == 0:
+                        siblings = node.get_children()
+                    else:
+                        branch = node.get_pth_parent(p - 1)
+                        siblings = branch.get_parent().get_children()
+                        siblings = siblings[siblings.index(branch) + 1:]
+                    expected.update([sibling.get_tree_position()
+                        for sibling in siblings if sibling.label == l])
+                expected = sorted(expected)
+
+                self.assertEqual(list(compact.expand_occurrences(rmos, p, l)),
+                        expected)
+                groups = compact._group_expansions_python(rmos, p, None, None)
+                self.assertEqual(list(groups.get(l, [])), expected)
+                groups = compact.group_expansions(rmos, p)
+                self.assertEqual(list(groups.get(l, [])), expected)
+                if expected:
+                    self.assertTrue(l in groups)
+                else:
+                    self.assertFalse(l in groups)
+
+            groups = compact.group_expansions(rmos, p, [0, 1])
+            self.assertTrue(set(groups.keys()) <= set([0, 1]))
+
+            # Thresholds only drop groups that are too small
+            groups = compact.group_expansions(rmos, p)
+            for threshold in [0, 3, 10, 40, 1000]:
+                expected = dict([(l, list(rmo_new)) for (l, rmo_new)
+                    in groups.items() if len(rmo_new) > threshold])
+                for found in [compact.group_expansions(rmos, p, None,
+                    threshold), compact._group_expansions_python(rmos, p,
+                        None, threshold)]:
+                    self.assertEqual(dict([(l, list(rmo_new)) for (l,
+                        rmo_new) in found.items()]), expected)
+
+
+    def test_group_identical_subtrees(self):
+
+        compact = tree.CompactTree.build_tree_from_string(
+                "a b -1 c -1 -1 a b -1 c -1 -1 a b -1 -1 b -1", "root")
+        self.assertEqual(compact.group_identical_subtrees(),
+                {compact.get_subtree_ids()[1]: [1, 4],
+                    compact.get_subtree_ids()[2]: [2, 5, 8, 9],
+                    compact.get_subtree_ids()[3]: [3, 6]})
+        root = compact.get_root()
+        (first, second, third, fourth) = root.get_children()
+        self.assertTrue(first.structural_equality(second))
+        self.assertFalse(first.structural_equality(third))
+        self.assertTrue(third.get_children()[0].structural_equality(fourth))
+
+        # Ids follow appends and stay out of the label dictionary
+        compact.append_subtree("a b -1 c -1 -1", 0)
+        self.assertEqual(sorted(compact.group_identical_subtrees().values()),
+                [[1, 4, 10], [2, 5, 8, 9, 11], [3, 6, 12]])
+        self.assertEqual(len(compact.get_label_dictionary().subtrees), 0)
+
+
+    def test_frozen(self):
+
+        self.assertRaises(AssertionError, self.root.append_child, "6")
+        self.assertRaises(AssertionError, self.root.unlock_tree)
+
+
+    def test_append_subtree(self):
+
+        self.assertEqual(list(self.compact.get_right_most_path()), [0, 1, 5])
+        self.assertRaises(AssertionError, self.compact.append_subtree,
+                "6 -1", 2)
+        self.assertRaises(AssertionError, self.compact.append_subtree,
+                "6 -1 -1", 1)
+        self.assertRaises(AssertionError, self.compact.append_subtree,
+                "6 -2 -1 -1", 1)
+
+        self.assertEqual(self.compact.append_subtree("6 7 -1 -1", 1), 6)
+        self.assertEqual(list(self.compact.get_right_most_path()),
+                [0, 1, 6, 7])
+        self.assertEqual(list(self.compact.ends), [8, 8, 5, 4, 5, 6, 8, 8])
+        self.assertEqual(self.node3.build_string_from_tree(),
+                "3 4 2 -1 1 -1 -1 5 -1 6 7 -1 -1 -1")
+        self.assertEqual(self.compact.get_pth_parent(7, 2), 1)
+        self.assertEqual(len(self.compact.get_label_occurrences()), 8)
+
+
+
+class ForestTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.forest = tree.Forest.from_strings(["a b -1 b -1 -1",
+            "a c -1 -1", "b -1"])
+        self.label_dictionary = self.forest.get_label_dictionary()
+
+
+    def test_structure(self):
+
+        self.assertEqual(self.forest.get_num_trees(), 3)
+        self.assertEqual(self.forest.get_num_nodes(), 6)
+        self.assertEqual(list(self.forest.roots), [0, 3, 5])
+        self.assertEqual(list(self.forest.tree_ids), [0, 0, 0, 1, 1, 2])
+        self.assertEqual(list(self.forest.parents), [-1, 0, 0, -1, 3, -1])
+        self.assertEqual(self.forest.get_tree_root(1).build_string_from_tree(),
+                "a c -1 -1")
+        self.assertEqual(self.forest.get_node(4).get_root().get_tree_position(),
+                3)
+        self.assertEqual(self.forest.get_tree_id(4), 1)
+
+
+    def test_from_trees(self):
+
+        roots = [tree.OrderedTreeNode.unrooted_build_tree_from_string(string)
+                for string in ["a b -1 b -1 -1", "a c -1 -1", "b -1"]]
+        forest = tree.Forest.from_trees(roots)
+        self.assertEqual(list(forest.ends), list(self.forest.ends))
+        self.assertEqual(list(forest.roots), list(self.forest.roots))
+
+
+    def test_count_support(self):
+
+        self.assertEqual(self.forest.get_support_base(), 3)
+        self.assertEqual(self.forest.count_support([]), 0)
+        self.assertEqual(self.forest.count_support([1, 2]), 1)
+        self.assertEqual(self.forest.count_support([1, 2, 5]), 2)
+        self.assertEqual(self.forest.count_support([0, 3, 4, 5]), 3)
+
+        # Occurrences never cross from one tree into the next
+        label_b = self.label_dictionary.find_label('b')
+        self.assertEqual(list(self.forest.expand_occurrences([0, 3], 0,
+            label_b)), [1, 2])
+        self.assertEqual(list(self.forest.expand_occurrences([1, 4], 1,
+            label_b)), [2])
+
+
+    def test_append_subtree(self):
+
+        self.assertRaises(AssertionError, self.forest.append_subtree,
+                "c -1", 3)
+        self.assertRaises(AssertionError, self.forest.append_subtree,
+                "a b -2 -1 -1")
+        self.assertEqual(self.forest.append_subtree("c -1", 5), 6)
+        self.assertEqual(self.forest.append_subtree("a -1 b c -1 -1"), 7)
+        self.assertEqual(self.forest.get_num_trees(), 5)
+        self.assertEqual(list(self.forest.roots), [0, 3, 5, 7, 8])
+        self.assertEqual(list(self.forest.tree_ids),
+                [0, 0, 0, 1, 1, 2, 2, 3, 4, 4])
+        self.assertEqual(self.forest.count_support([2, 6, 9]), 3)
+
+class CompressedTreeTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tree_string = "a b -1 c -1 -1 a b -1 c -1 -1 a b -1 -1 b -1"
+        self.compressed = tree.CompressedTree.build_tree_from_string(
+                self.tree_string, "root")
+        self.compact = tree.CompactTree.build_tree_from_string(
+                self.tree_string, "root",
+                self.compressed.get_label_dictionary())
+
+
+    def test_structure(self):
+
+        compressed = self.compressed
+        self.assertEqual(compressed.get_num_nodes(), 10)
+        self.assertEqual(compressed.get_num_distinct_subtrees(), 5)
+        states = [compressed.get_label_dictionary().get_state(label) for
+                label in compressed.labels]
+        self.assertEqual(states, ["b", "c", "a", "a", "root"])
+        self.assertEqual(list(compressed.sizes), [1, 1, 3, 2, 10])
+        self.assertEqual(list(compressed.multiplicities), [4, 2, 2, 1, 1])
+        self.assertEqual(list(compressed.children), [0, 1, 0, 2, 2, 3, 0])
+        self.assertEqual(compressed.expand().get_root().build_string_from_tree(),
+                self.compact.get_root().build_string_from_tree())
+
+        # Built from a TreeNode tree the same subtrees are shared
+        root = tree.OrderedTreeNode.unrooted_build_tree_from_string(
+                "root " + self.tree_string + " -1")
+        compressed = tree.CompressedTree.from_tree(root,
+                self.compressed.get_label_dictionary())
+        self.assertEqual(list(compressed.children),
+                list(self.compressed.children))
+        self.assertRaises(AssertionError, tree.CompressedTree.build_tree_from_string,
+                "a -1 -1", "root")
+
+
+    def test_group_expansions(self):
+
+        compressed = self.compressed
+        occurrences = compressed.get_label_occurrences()
+        label_a = compressed.get_label_dictionary().find_label("a")
+        label_b = compressed.get_label_dictionary().find_label("b")
+        label_c = compressed.get_label_dictionary().find_label("c")
+        self.assertEqual(compressed.count_support(occurrences[label_b]), 4)
+        self.assertEqual(list(compressed.get_positions(occurrences[label_b])),
+                [2, 5, 8, 9])
+
+        # Occurrences expand once per distinct subtree
+        rmos = compressed.expand_occurrences(occurrences[label_a], 0, label_b)
+        self.assertEqual(rmos, [(2, (0,)), (3, (0,))])
+        self.assertEqual(compressed.count_support(rmos), 3)
+        self.assertEqual(list(compressed.get_positions(rmos)),
+                list(self.compact.expand_occurrences(
+                    self.compact.get_label_occurrences()[label_a], 0, label_b)))
+        groups = compressed.group_expansions(rmos, 1, threshold=1)
+        self.assertEqual(groups, {label_c: [(2, (1,))]})
+        self.assertEqual(list(compressed.get_positions(groups[label_c])),
+                [3, 6])
+        self.assertEqual(compressed.group_expansions(rmos, 1, threshold=2), {})
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2009, Regents of the University of California
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#
+#     * Neither the name of the University of California, Los Angeles
+#     nor the names of its contributors may be used to endorse or
+#     promote products derived from this software without specific prior
+#     written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Author: Roy Shea
+# Date: June 2009
+
+import unittest
+import os
+import tempfile
+import StringIO
+import tree
+import freqt
+import parallel
+import treeio
+
+class TestTreeIO(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tree_string = "root 10 11 -1 2 -1 1 -1 -1 1 12 -1 -1 -1"
+        self.expected = tree.CompactTree.unrooted_build_tree_from_string(
+                self.tree_string)
+
+
+    def assertSameTree(self, compact, expected):
+        self.assertEqual(list(compact.labels), list(expected.labels))
+        self.assertEqual(list(compact.parents), list(expected.parents))
+        self.assertEqual(list(compact.depths), list(expected.depths))
+        self.assertEqual(list(compact.ends), list(expected.ends))
+        self.assertEqual([list(level) for level in compact.levels],
+                [list(level) for level in expected.levels])
+        self.assertEqual(compact.get_root().build_string_from_tree(),
+                expected.get_root().build_string_from_tree())
+
+
+    def test_iter_token_chunks(self):
+
+        for chunk_size in range(1, 20):
+            source = StringIO.StringIO(" %s \n" % self.tree_string)
+            tokens = []
+            for chunk in treeio.iter_token_chunks(source, chunk_size):
+                self.assertTrue(chunk)
+                tokens += chunk
+            self.assertEqual(tokens, self.tree_string.split())
+
+
+    def test_load_compact_tree(self):
+
+        for chunk_size in [1, 2, 3, 7, 1000]:
+            compact = treeio.load_compact_tree(StringIO.StringIO(
+                self.tree_string), chunk_size=chunk_size)
+            self.assertSameTree(compact, self.expected)
+
+        # Rooted strings describe the children of root_state
+        compact = treeio.load_compact_tree(StringIO.StringIO(
+            "10 11 -1 2 -1 1 -1 -1 1 12 -2"), "root", chunk_size=4)
+        self.assertEqual(compact.get_root().build_string_from_tree(),
+                "root 10 11 -1 2 -1 1 -1 -1 1 12 -1 -1 -1")
+        self.assertRaises(AssertionError, treeio.load_compact_tree,
+                StringIO.StringIO("10 -1 -1"), "root")
+        self.assertRaises(AssertionError, treeio.load_compact_tree,
+                StringIO.StringIO("a -1 b -1"))
+
+
+    def test_load_compressed_tree(self):
+
+        for chunk_size in [1, 3, 1000]:
+            compressed = treeio.load_compressed_tree(StringIO.StringIO(
+                self.tree_string), chunk_size=chunk_size)
+            self.assertSameTree(compressed.expand(), self.expected)
+        compressed = treeio.load_compressed_tree(StringIO.StringIO(
+            "a b -1 -1 a b -1 -1"), "root", chunk_size=2)
+        self.assertEqual(compressed.get_num_distinct_subtrees(), 3)
+        self.assertEqual(compressed.get_num_nodes(), 5)
+        self.assertRaises(AssertionError, treeio.load_compressed_tree,
+                StringIO.StringIO("a -1 b -1"))
+
+
+    def test_load_forest(self):
+
+        tree_strings = ["a b -1 b -1 -1", "a c -1 -1", "b -1"]
+        forest = treeio.load_forest(StringIO.StringIO(
+            "\n".join(tree_strings)), chunk_size=5)
+        expected = tree.Forest.from_strings(tree_strings)
+        self.assertSameTree(forest, expected)
+        self.assertEqual(list(forest.roots), list(expected.roots))
+        self.assertEqual(list(forest.tree_ids), list(expected.tree_ids))
+        self.assertRaises(AssertionError, treeio.load_forest,
+                StringIO.StringIO("a b -1"))
+
+
+    def test_load_file(self):
+
+        (handle, filename) = tempfile.mkstemp()
+        try:
+            os.write(handle, self.tree_string)
+            os.close(handle)
+            compact = treeio.load_file(filename, chunk_size=8)
+            self.assertSameTree(compact, self.expected)
+
+            # Empty files can not be memory mapped
+            open(filename, "w").close()
+            self.assertRaises(AssertionError, treeio.load_file, filename)
+        finally:
+            os.remove(filename)
+
+    def test_binary(self):
+
+        (handle, filename) = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            root = tree.OrderedTreeNode.unrooted_build_tree_from_string(
+                    "root 1 1 -1 2 -1 1 -1 2 -1 -1 1 1 -1 1 -1 2 -1 -1 -1")
+            treeio.save_binary(root, filename)
+            loaded = treeio.load_binary(filename)
+            self.assertSameTree(loaded, root.get_compact_tree())
+            self.assertEqual(loaded.get_label_dictionary().states,
+                    root.get_label_dictionary().states)
+            self.assertEqual(freqt.freqt(loaded, 0.1).keys(),
+                    freqt.freqt(root, 0.1).keys())
+            for (size, subtrees) in freqt.freqt(root, 0.1).items():
+                self.assertEqual(sorted(subtrees.keys()),
+                        sorted(freqt.freqt(loaded, 0.1)[size].keys()))
+            self.assertEqual(parallel.parallel_freqt(loaded, 0.1, 2)[3].keys(),
+                    parallel.parallel_freqt(root, 0.1, 2)[3].keys())
+            if tree.numpy is not None:
+                self.assertRaises(AssertionError, loaded.append_subtree,
+                        "3 -1", 0)
+
+            forest = tree.Forest.from_strings(["a b -1 b -1 -1",
+                "a c -1 -1", "b -1"])
+            treeio.save_binary(forest, filename)
+            loaded = treeio.load_binary(filename)
+            self.assertTrue(isinstance(loaded, tree.Forest))
+            self.assertSameTree(loaded, forest)
+            self.assertEqual(list(loaded.roots), list(forest.roots))
+            self.assertEqual(list(loaded.tree_ids), list(forest.tree_ids))
+            self.assertEqual(loaded.count_support([1, 2, 5]), 2)
+
+            # States are checked against a given dictionary
+            label_dictionary = tree.LabelDictionary()
+            label_dictionary.get_label('b')
+            self.assertRaises(AssertionError, treeio.load_binary, filename,
+                    label_dictionary)
+
+            # Nodes without a state are stored as "None"
+            root = tree.TreeNode()
+            root.build_tree_from_string("a -1")
+            treeio.save_binary(root, filename)
+            self.assertEqual(treeio.load_binary(
+                filename).get_label_dictionary().states, ["None", "a"])
+            label_dictionary = tree.LabelDictionary()
+            label_dictionary.get_label(None)
+            compact = tree.CompactTree.build_tree_from_string("a -1", "r",
+                    label_dictionary)
+            treeio.save_binary(compact, filename)
+            self.assertEqual(treeio.load_binary(
+                filename).get_label_dictionary().states, ["None", "r", "a"])
+
+            open(filename, "wb").write(self.tree_string)
+            self.assertRaises(AssertionError, treeio.load_binary, filename)
+        finally:
+            os.remove(filename)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2009, Regents of the University of California
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#
+#     * Neither the name of the University of California, Los Angeles
+#     nor the names of its contributors may be used to endorse or
+#     promote products derived from this software without specific prior
+#     written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Author: Roy Shea
+# Date: June 2009
+
+import unittest
+import json
+import StringIO
+import tree
+import freqt
+import writers
+
+class CountingFile():
+    """File-like object recording each write."""
+
+    def __init__(self):
+        self.writes = []
+
+
+    def write(self, text):
+        self.writes.append(text)
+
+
+    def getvalue(self):
+        return "".join(self.writes)
+
+
+class TestWriters(unittest.TestCase):
+
+    def setUp(self):
+
+        # Tree used throughout the tests
+        self.tree_string = "root 1 1 -1 2 -1 1 -1 2 -1 -1 1 1 -1 1 -1 2 -1 -1 -1"
+        self.root = tree.OrderedTreeNode.unrooted_build_tree_from_string(self.tree_string)
+        self.root.lock_tree()
+        self.label_dictionary = self.root.get_compact_tree().get_label_dictionary()
+        self.minsup = 0.1
+        self.expected = freqt.freqt(self.root, self.minsup)
+
+
+    def found(self):
+        """Map build strings of the expected results to (size, support,
+        rmos)."""
+        found = {}
+        for (size, subtrees) in self.expected.items():
+            for (subtree, rmos) in subtrees.items():
+                found[subtree] = (size, len(rmos), list(rmos))
+        return found
+
+
+    def test_dot_writer(self):
+
+        out = StringIO.StringIO()
+        writer = writers.DotWriter(out, self.label_dictionary)
+        writer.write_results(freqt.iter_freqt(self.root, self.minsup))
+        writer.close()
+        graphs = out.getvalue().split("digraph {\n")[1:]
+        self.assertEqual(len(graphs), len(self.found()))
+
+        pattern = freqt.Pattern.from_build_string("1 1 -1 2 -1 -1",
+                self.label_dictionary)
+        out = StringIO.StringIO()
+        writer = writers.DotWriter(out, self.label_dictionary)
+        writer.write(3, pattern, 2, [3, 5])
+        writer.close()
+        self.assertEqual(out.getvalue(), "# size: 3 support: 2\n" +
+                "digraph {\nnode_0_1 [label=1]\nnode_1_1 [label=1]\n" +
+                "node_0_1 -> node_1_1\nnode_2_2 [label=2]\n" +
+                "node_0_1 -> node_2_2\n}\n\n")
+
+
+    def test_json_lines_writer(self):
+
+        out = StringIO.StringIO()
+        writer = writers.JsonLinesWriter(out, self.label_dictionary, True)
+        freqt.freqt_dfs(self.root, self.minsup, writer.write)
+        writer.close()
+        found = {}
+        for line in out.getvalue().splitlines():
+            record = json.loads(line)
+            found[record["tree"]] = (record["size"], record["support"],
+                    record["rmos"])
+        self.assertEqual(found, self.found())
+
+
+    def test_binary_writer(self):
+
+        for occurrences in [True, False]:
+            out = StringIO.StringIO()
+            writer = writers.BinaryWriter(out, self.label_dictionary,
+                    occurrences)
+            writer.write_results(freqt.iter_freqt(self.root, self.minsup))
+            writer.close()
+            out.seek(0)
+            found = {}
+            for (size, subtree, support, rmos) in \
+                    writers.iter_binary_results(out):
+                found[subtree] = (size, support, rmos)
+            expected = self.found()
+            if not occurrences:
+                for (subtree, (size, support, rmos)) in expected.items():
+                    expected[subtree] = (size, support, [])
+            self.assertEqual(found, expected)
+
+        out = StringIO.StringIO("PYOPTR\x00\x01\x01\x00")
+        self.assertRaises(AssertionError, list,
+                writers.iter_binary_results(out))
+
+
+    def test_compressed(self):
+
+        # Compressed occurrences are written as expanded positions
+        compressed = tree.CompressedTree.build_tree_from_string(
+                "a b -1 -1 a b -1 -1 a -1", "root")
+        compact = compressed.expand()
+        label_dictionary = compressed.get_label_dictionary()
+        out = StringIO.StringIO()
+        writer = writers.BinaryWriter(out, label_dictionary, data=compressed)
+        writer.write_results(freqt.iter_freqt(compressed, 0.1))
+        writer.close()
+        out.seek(0)
+        found = sorted(writers.iter_binary_results(out))
+        out = StringIO.StringIO()
+        writer = writers.BinaryWriter(out, label_dictionary)
+        writer.write_results(freqt.iter_freqt(compact, 0.1))
+        writer.close()
+        out.seek(0)
+        self.assertEqual(found, sorted(writers.iter_binary_results(out)))
+        self.assertEqual(found[0][3], [1, 3, 5])
+
+        out = StringIO.StringIO()
+        writer = writers.JsonLinesWriter(out, label_dictionary, True,
+                data=compressed)
+        writer.write_results(freqt.iter_freqt(compressed, 0.1, max_size=1))
+        writer.close()
+        records = dict([(record["tree"], record["rmos"]) for record in
+            map(json.loads, out.getvalue().splitlines())])
+        self.assertEqual(records["a -1"], [1, 3, 5])
+
+        # Without the tree they are rejected
+        for writer in [writers.BinaryWriter(StringIO.StringIO(),
+                label_dictionary), writers.JsonLinesWriter(StringIO.StringIO(),
+                    label_dictionary, True)]:
+            self.assertRaises(AssertionError, writer.write_results,
+                    freqt.iter_freqt(compressed, 0.1))
+
+
+    def test_buffering(self):
+
+        # Output is written in chunks of about buffer_size bytes
+        unbuffered = CountingFile()
+        writer = writers.JsonLinesWriter(unbuffered, self.label_dictionary,
+                buffer_size=1)
+        writer.write_results(freqt.iter_freqt(self.root, self.minsup))
+        writer.close()
+        out = CountingFile()
+        writer = writers.JsonLinesWriter(out, self.label_dictionary,
+                buffer_size=100)
+        writer.write_results(freqt.iter_freqt(self.root, self.minsup))
+        self.assertTrue(all([len(text) >= 100 for text in out.writes]))
+        writer.close()
+        self.assertEqual(out.getvalue(), unbuffered.getvalue())
+        self.assertTrue(len(out.writes) < len(unbuffered.writes))
+
+
+if __name__ == '__main__':
+    unittest.main()
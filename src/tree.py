@@ -36,6 +36,114 @@
 # Author: Roy Shea
 # Date: June 2009
 
+import array
+import bisect
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def level_ancestor(levels, position, depth, p):
+    """Return the position of the pth ancestor of a node.
+
+    The node is identified by its pre-order position and depth.  levels
+    lists, for each depth, the pre-order positions of the nodes at that
+    depth in increasing order.  The pth ancestor of the node is the last
+    node at depth - p that precedes the node in pre-order, so it can be
+    found with a binary search.  An IndexError is raised if p is greater
+    than depth.
+    """
+    if p == 0:
+        return position
+    if p > depth or p < 0:
+        raise IndexError("pth parent passes the root")
+    level = levels[depth - p]
+    return level[bisect.bisect_right(level, position) - 1]
+
+
+def as_numpy_array(values):
+    """Return an integer sequence as a NumPy array, sharing memory with
+    array.array sequences where possible."""
+    if isinstance(values, array.array) and values.itemsize == \
+            numpy.dtype(numpy.intc).itemsize and values.typecode == 'i':
+        if len(values) == 0:
+            return numpy.zeros(0, dtype=numpy.intc)
+        return numpy.frombuffer(values, dtype=numpy.intc)
+    return numpy.asarray(values, dtype=numpy.intc)
+
+
+def expand_ranges(starts, stops):
+    """Return the concatenation of range(start, stop) over NumPy arrays
+    of starts and stops."""
+    lengths = stops - starts
+    keep = lengths > 0
+    starts = starts[keep]
+    lengths = lengths[keep]
+    if len(lengths) == 0:
+        return numpy.zeros(0, dtype=numpy.intc)
+    offsets = numpy.cumsum(lengths) - lengths
+    return numpy.arange(lengths.sum(), dtype=numpy.intc) - \
+            numpy.repeat(offsets - starts, lengths).astype(numpy.intc)
+
+
+class LabelDictionary():
+    """Dictionary mapping node states to dense integer labels.
+
+    Each distinct state is assigned the next unused integer, starting
+    from 0, the first time it is seen.  Trees sharing a dictionary can
+    compare node states by comparing their integer labels.
+
+    The dictionary also hash-conses rooted ordered subtrees.  A subtree
+    is keyed by the label of its root and the ids of its children's
+    subtrees, in order, and each distinct key is assigned the next
+    unused subtree id.  Since keys are compared in full on a hash
+    match, two subtrees over the same dictionary are structurally equal
+    exactly when their ids are.
+    """
+
+    def __init__(self):
+        self.states = []
+        self.labels = {}
+        self.subtrees = {}
+
+
+    def __len__(self):
+        return len(self.states)
+
+
+    def get_label(self, state):
+        """Return the label of state, adding state if it is new."""
+        label = self.labels.get(state)
+        if label is None:
+            label = len(self.states)
+            self.labels[state] = label
+            self.states.append(state)
+        return label
+
+
+    def find_label(self, state):
+        """Return the label of state or None if state is unknown."""
+        return self.labels.get(state)
+
+
+    def get_state(self, label):
+        """Return the state assigned label."""
+        return self.states[label]
+
+
+    def get_subtree_id(self, label, child_ids):
+        """Return the id of the subtree with a root labelled label and
+        children with the subtree ids in the tuple child_ids, adding the
+        subtree if it is new."""
+        key = (label, child_ids)
+        subtree_id = self.subtrees.get(key)
+        if subtree_id is None:
+            subtree_id = len(self.subtrees)
+            self.subtrees[key] = subtree_id
+        return subtree_id
+
+
 class TreeNode():
     """Node in a tree data structure.
 
@@ -49,11 +157,6 @@ class TreeNode():
     def __init__(self, state=None, parent=None):
         """Create a new node with optional state."""
         self.parent = parent
-
-        self.ancestors = [self]
-        if parent:
-            self.ancestors += self.parent.ancestors
-
         self.children = []
 
         if state:
@@ -71,8 +174,13 @@ class TreeNode():
         # in each node is valid.
         self.locked = False
         self.depth = None
-        self.successors = None
-        self.successors_visited = False
+        self.position = None
+        self.end = None
+        self.preorder = None
+        self.levels = None
+        self.label = None
+        self.label_dictionary = None
+        self.compact_tree = None
 
         return
 
@@ -83,80 +191,79 @@ class TreeNode():
         return
 
 
-    def _set_depth(self):
-        """Set depths of nodes."""
-        root = self.get_root()
-        work_list = [(root, 0)]
-        while work_list:
-            (node, depth) = work_list.pop()
-            node.depth = depth
-            for child in node.get_children():
-                work_list.append((child, depth + 1))
-        return
+    def _lock(self, label_dictionary):
+        """Lock every node of the tree in a single traversal.
 
+        Each node is assigned its depth, its depth first pre-order
+        position, the end of the pre-order range covered by its
+        subtree and the label of its state in label_dictionary, and is
+        marked locked.  The nodes rooted under a node are then exactly
+        preorder[position:end], where preorder is a single list shared
+        by every node in the tree.  The positions found at each depth
+        are recorded in levels, which is used to answer get_pth_parent.
+        This takes O(num_nodes) time and memory.
 
-    def _set_successors(self):
-        """Set the successors to a given node.
+        Basic strategy is to use a stack to do a depth first traversal
+        of the tree.  When a node is popped from the stack, a marked
+        version of the node is pushed back on followed by its children.
+        When a marked version of a node is popped from the stack, all
+        of its successors have been numbered, so its end is known.
 
-        This is a cute algorithm that sets the pre-order successors of
-        each node in a tree using one traversal and only O(branching *
-        depth) memory.  Although that memory number is ignoring the
-        space required by the calculated result, which could be
-        O(num_nodes * num_nodes).
+        States are labelled by their string form, as in
+        CompactTreeBuilder, so a node without a state gets the label of
+        "None" in both.
 
-        Basic strategy is to use a stack to do a depth first traversal
-        of the tree.  When a node is popped from the stack, a special
-        marked version of the node is popped back on followed by its
-        children.  When a marked version of a node is popped from the
-        stack, it must be the case that the children are done, so its
-        successors can be calculated from them.
-
-        This algorithm assumes that get_children returns children in
-        order.
+        This algorithm assumes that children are stored in order.
         """
         root = self.get_root()
-        work_list = [root]
+        preorder = []
+        levels = []
+        get_label = label_dictionary.get_label
+        work_list = [(root, 0)]
         while work_list:
-            node = work_list.pop()
-            if node.successors_visited == True:
-                # Set successor data for current node.  Since this is
-                # the second time visiting this node, it must be the
-                # case that the successors of children has been
-                # computed.
-                node.successors = []
-                for child in node.get_children():
-                    node.successors.append(child)
-                    node.successors += child.successors
-            else:
-                # Mark node as visited, replace on stack, add children
-                # to stack.
-                node.successors_visited = True
-                work_list.append(node)
-                work_list += node.get_children()
-        return
-
+            (node, depth) = work_list.pop()
+            if depth < 0:
+                node.end = len(preorder)
+                continue
 
-    def _lock(self):
-        """Lock a node and its children."""
-        root = self.get_root()
-        work_list = [root]
-        while work_list:
-            node = work_list.pop()
-            work_list += node.get_children()
+            position = len(preorder)
+            node.depth = depth
+            node.position = position
+            node.preorder = preorder
+            node.levels = levels
+            node.label = get_label(str(node.state))
+            node.label_dictionary = label_dictionary
             node.locked = True
+            if depth == len(levels):
+                levels.append(array.array('i'))
+            levels[depth].append(position)
+            preorder.append(node)
+
+            # A negative depth marks a node whose successors are done
+            work_list.append((node, -1))
+            children = node.children
+            for i in range(len(children) - 1, -1, -1):
+                work_list.append((children[i], depth + 1))
+        return
 
 
-    def lock_tree(self):
+    def lock_tree(self, label_dictionary=None):
         """Lock the tree.
 
         Calculate state for each node that is non-local (ie. number of
         nodes rooted from current location) and prevent future changes
         to the tree.  Any future changes will first require unlocking
         the tree, which invalidates non-local data.
+
+        Node states are mapped to integer labels using label_dictionary.
+        If it is not given the dictionary used by the last lock of the
+        tree, or a new dictionary, is used.
         """
-        self._set_depth()
-        self._set_successors()
-        self._lock()
+        if label_dictionary is None:
+            label_dictionary = self.get_root().label_dictionary
+        if label_dictionary is None:
+            label_dictionary = LabelDictionary()
+        self._lock(label_dictionary)
         return
 
 
@@ -173,20 +280,109 @@ class TreeNode():
             work_list += node.get_children()
             node.locked = False
             node.depth = None
-            node.successors = None
-            node.successors_visited = False
-            node.parent = None
+            node.position = None
+            node.end = None
+            node.preorder = None
+            node.levels = None
+            node.label = None
+            node.compact_tree = None
         return
 
 
     def append_child(self, state=None):
         """Create a new child node of self with optional state."""
         assert self.locked == False, "Must first unlock tree.\n"
+        return self._append_child(state)
+
+
+    def _append_child(self, state):
+        """Create a new last child of self, ignoring locks."""
         child = TreeNode(state, self)
         self._store_child(child)
         return child
 
 
+    def append_subtree(self, tree_string):
+        """Append the trees described by tree_string below self.
+
+        tree_string uses the format of build_tree_from_string.  On an
+        unlocked tree this is the same as build_tree_from_string.  A
+        locked tree stays locked.  If self is on the right most path of
+        the tree, the new nodes follow every existing node in pre-order,
+        so they are numbered, labelled and added to the level index in
+        place and only the ends of self and its ancestors change.  This
+        takes time in the number of new nodes plus the depth of self, and
+        a CompactTree from get_compact_tree is extended the same way.
+        Appending anywhere else relocks the whole tree.
+        """
+
+        if not self.locked:
+            return self.build_tree_from_string(tree_string)
+
+        # Check the string before changing the tree
+        tokens = tree_string.split()
+        depth = 0
+        for token in tokens:
+            if token == '-1':
+                assert depth > 0, "Malformed build string.\n"
+                depth -= 1
+            else:
+                assert token != '-2', "Appends can not return to the root.\n"
+                depth += 1
+        assert depth == 0, "Malformed build string.\n"
+
+        root = self.get_root()
+        if self.end != len(self.preorder):
+            self.unlock_tree()
+            self.build_tree_from_string(tree_string)
+            root.lock_tree()
+            return self
+
+        preorder = self.preorder
+        levels = self.levels
+        current_node = self
+        for token in tokens:
+            if token == '-1':
+                current_node.end = len(preorder)
+                current_node = current_node.parent
+                continue
+
+            node = current_node._append_child(token)
+            node.depth = current_node.depth + 1
+            node.position = len(preorder)
+            node.preorder = preorder
+            node.levels = levels
+            if node.depth == len(levels):
+                levels.append(array.array('i'))
+            levels[node.depth].append(node.position)
+            preorder.append(node)
+            node.label = self.label_dictionary.get_label(node.state)
+            node.label_dictionary = self.label_dictionary
+            node.locked = True
+            current_node = node
+
+        node = self
+        while node is not None:
+            node.end = len(preorder)
+            node = node.parent
+
+        if root.compact_tree is not None:
+            root.compact_tree.append_subtree(tree_string, self.position)
+        return self
+
+
+    def get_subtree_id(self):
+        """Return the id of the subtree rooted at self.
+
+        Nodes of the same locked tree have the same subtree id exactly
+        when their rooted subtrees are structurally equal.  Ids are read
+        from get_compact_tree, so they are found on first use and
+        cleared by appends.  See CompactTree.get_subtree_ids.
+        """
+        assert self.locked == True, "Must first lock tree.\n"
+        return self.get_compact_tree().get_subtree_ids()[self.position]
+
+
     def get_num_children(self):
         """Return the number of children of a node."""
         return len(self.get_children())
@@ -208,8 +404,22 @@ class TreeNode():
         The 0th parent of a node is itself.  It is considered an error
         if p is greater than depth of self, since this would pass the
         root of the tree.
+
+        In a locked tree this is answered in O(log num_nodes) using the
+        level index built by lock_tree.  Otherwise the parent pointers
+        are followed.
         """
-        return self.ancestors[p]
+        if self.locked:
+            position = level_ancestor(self.levels, self.position,
+                    self.depth, p)
+            return self.preorder[position]
+
+        node = self
+        for i in range(p):
+            node = node.parent
+            if node is None:
+                raise IndexError("pth parent passes the root")
+        return node
 
 
     def get_depth(self):
@@ -221,26 +431,60 @@ class TreeNode():
         return self.depth
 
 
+    def get_label_dictionary(self):
+        """Return the dictionary used to label the states of the tree."""
+        assert self.locked == True, "Must first lock tree.\n"
+        return self.label_dictionary
+
+
+    def get_compact_tree(self):
+        """Return a CompactTree holding the entire locked tree.
+
+        Positions within the CompactTree match get_tree_position.  The
+        CompactTree is built on first use and kept until the tree is
+        unlocked.
+        """
+        assert self.locked == True, "Must first lock tree.\n"
+        root = self.get_root()
+        if root.compact_tree is None:
+            root.compact_tree = CompactTree.from_tree(root,
+                    root.label_dictionary)
+        return root.compact_tree
+
+
     def get_root(self):
         """Return the root of the tree.
 
         The root is assumed to be the only node in the tree that has no
         parent.
         """
-        return self.ancestors[-1]
+        if self.locked:
+            return self.preorder[0]
+
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return node
 
 
     def get_num_nodes(self, depth=0):
         """Return the number of nodes rooted under self (including self)."""
         assert self.locked == True, "Must first lock tree.\n"
-        return len(self.successors) + 1
+        return self.end - self.position
 
 
     def get_nodes(self):
         """Return the list of nodes in the tree rooted under self
         (including self)."""
         assert self.locked == True, "Must first lock tree.\n"
-        return [self] + self.successors
+        return self.preorder[self.position:self.end]
+
+
+    def is_descendant_of(self, other):
+        """Return True if self is rooted under other (excluding other)."""
+        assert self.locked == True, "Must first lock tree.\n"
+        return self.preorder is other.preorder and \
+                other.position < self.position < other.end
 
 
     def build_tree_from_string(self, tree_string):
@@ -278,12 +522,12 @@ class TreeNode():
     def print_tree(self):
         """Print the rooted tree."""
         work_list = [self]
-        out_string = ""
+        out = []
         while work_list:
             node = work_list.pop()
-            out_string += str(node)
-            work_list += node.get_children()
-        return out_string
+            out.append(str(node))
+            work_list.extend(node.get_children())
+        return "".join(out)
 
 
     @classmethod
@@ -310,11 +554,6 @@ class OrderedTreeNode(TreeNode):
     ordering of children.
     """
 
-    def __init__(self, state=None, parent=None):
-        TreeNode.__init__(self, state, parent)
-        self.position = None
-
-
     def get_tree_position(self):
         """Return the position of the node in the tree.
 
@@ -335,83 +574,9 @@ class OrderedTreeNode(TreeNode):
         return
 
 
-    def _update_positions(self):
-        """Update the position of each node in a tree.
-
-        Positions are determined based on a depth first pre-ordering
-        with the root node at position 0.
-        """
-        root = self.get_root()
-        nodes = root.get_nodes()
-        for (node, position) in zip(nodes, range(len(nodes))):
-            node.position = position
-
-
-    def _set_successors(self):
-        """Set the successors to a given node.
-
-        This is a cute algorithm that sets the pre-order successors of
-        each node in a tree using one traversal and only O(branching *
-        depth) memory.  Although that memory number is ignoring the
-        space required by the calculated result, which could be
-        O(num_nodes * num_nodes).
-
-        Basic strategy is to use a stack to do a depth first traversal
-        of the tree.  When a node is popped from the stack, a special
-        marked version of the node is popped back on followed by its
-        children.  When a marked version of a node is popped from the
-        stack, it must be the case that the children are done, so its
-        successors can be calculated from them.
-
-        This algorithm assumes that get_children returns children in
-        order.
-        """
-        root = self.get_root()
-        work_list = [root]
-        while work_list:
-            node = work_list.pop()
-            if node.successors_visited == True:
-                # Set successor data for current node.  Since this is
-                # the second time visiting this node, it must be the
-                # case that the successors of children has been
-                # computed.
-                node.successors = []
-                for child in node.get_children():
-                    node.successors.append(child)
-                    node.successors += child.successors
-            else:
-                # Mark node as visited, replace on stack, add children
-                # to stack.
-                node.successors_visited = True
-                work_list.append(node)
-                work_list += node.get_children()
-        return
-
-
-    def _clear_positions(self):
-        """Clear position information."""
-        root = self.get_root()
-        work_list = [root]
-        while work_list:
-            node = work_list.pop()
-            work_list += node.get_children()
-            node.position = None
-
-
-    def unlock_tree(self):
-        TreeNode.unlock_tree(self)
-        self._clear_positions()
-
-
-    def lock_tree(self):
-        TreeNode.lock_tree(self)
-        self._update_positions()
-
-
-    def append_child(self, state=None):
+    def _append_child(self, state):
         """Create a new child node of self with optional state and
-        insert it after all other children."""
-        assert self.locked == False, "Must first unlock tree.\n"
+        insert it after all other children, ignoring locks."""
         child = OrderedTreeNode(state, self)
         self._store_child(child, len(self.get_children()))
         return child
@@ -429,7 +594,12 @@ class OrderedTreeNode(TreeNode):
         """State and connectivity equality over the rooted subtree.
 
         Note that this is defined over OrderedTreeNode trees since it
-        assumes a specific ordering of child nodes."""
+        assumes a specific ordering of child nodes.  Nodes of the same
+        locked tree are compared by subtree id in O(1) time once the ids
+        are found."""
+
+        if self.locked and other.locked and self.preorder is other.preorder:
+            return self.get_subtree_id() == other.get_subtree_id()
 
         # Ensure that the current nodes are equal
         if self.state == other.state and \
@@ -468,3 +638,1301 @@ class OrderedTreeNode(TreeNode):
         state = tree_string.split()
         root = OrderedTreeNode(state[0])
         return root.build_tree_from_string(" ".join(state[1:-1]))
+
+
+class CompactTreeBuilder():
+    """Incrementally construct the arrays backing a CompactTree.
+
+    Nodes are added in depth first pre-order using push, which opens a
+    new child below the most recently opened node, and pop, which closes
+    the most recently opened node.  This mirrors the "build string"
+    format used by build_tree_from_string.  Pushing a node when no node
+    is open starts a new tree, which is only allowed when building a
+    Forest.
+    """
+
+    def __init__(self, label_dictionary=None):
+        if label_dictionary is None:
+            label_dictionary = LabelDictionary()
+        self.label_dictionary = label_dictionary
+        self.labels = array.array('i')
+        self.parents = array.array('i')
+        self.depths = array.array('i')
+        self.ends = array.array('i')
+        self.levels = []
+        self.roots = array.array('i')
+        self.open_nodes = []
+
+
+    def push(self, state):
+        """Open a new node with state below the current node."""
+        label = self.label_dictionary.get_label(str(state))
+        position = len(self.labels)
+        if self.open_nodes:
+            self.parents.append(self.open_nodes[-1])
+        else:
+            self.roots.append(position)
+            self.parents.append(-1)
+        depth = len(self.open_nodes)
+        if depth == len(self.levels):
+            self.levels.append(array.array('i'))
+        self.levels[depth].append(position)
+        self.labels.append(label)
+        self.depths.append(depth)
+        self.ends.append(position + 1)
+        self.open_nodes.append(position)
+        return position
+
+
+    def pop(self):
+        """Close the current node and return to its parent."""
+        position = self.open_nodes.pop()
+        self.ends[position] = len(self.labels)
+        return position
+
+
+    def add_token(self, token):
+        """Consume one token of a build string.
+
+        The root may not be closed by a "-1" token, since doing so
+        would leave the tree with no node to attach further children.
+        """
+        if token == '-1':
+            assert len(self.open_nodes) > 1, "Malformed build string.\n"
+            self.pop()
+        elif token == '-2':
+            while len(self.open_nodes) > 1:
+                self.pop()
+        else:
+            self.push(token)
+        return
+
+
+    def add_tokens(self, tokens, close_roots=False):
+        """Consume a list of build string tokens.
+
+        This is the same as calling add_token on each token, except that
+        if close_roots is set a "-1" token may close a root.  push and
+        pop are inlined, as this is the inner loop when loading large
+        trees.
+        """
+        get_label = self.label_dictionary.get_label
+        labels = self.labels
+        parents = self.parents
+        depths = self.depths
+        ends = self.ends
+        levels = self.levels
+        roots = self.roots
+        open_nodes = self.open_nodes
+        position = len(labels)
+        for token in tokens:
+            if token == '-1':
+                assert len(open_nodes) > 1 or (close_roots and open_nodes), \
+                        "Malformed build string.\n"
+                ends[open_nodes.pop()] = position
+            elif token == '-2':
+                while len(open_nodes) > 1:
+                    ends[open_nodes.pop()] = position
+            else:
+                depth = len(open_nodes)
+                if depth:
+                    parents.append(open_nodes[-1])
+                else:
+                    roots.append(position)
+                    parents.append(-1)
+                if depth == len(levels):
+                    levels.append(array.array('i'))
+                levels[depth].append(position)
+                labels.append(get_label(token))
+                depths.append(depth)
+                ends.append(position + 1)
+                open_nodes.append(position)
+                position += 1
+        return
+
+
+    def add_tree(self, root):
+        """Add the TreeNode tree rooted at root below the current node."""
+        work_list = [(root, False)]
+        while work_list:
+            (node, visited) = work_list.pop()
+            if visited:
+                self.pop()
+            else:
+                self.push(node.state)
+                work_list.append((node, True))
+                for child in reversed(node.get_children()):
+                    work_list.append((child, False))
+        return
+
+
+    def _reopen(self, compact_tree, roots, open_nodes):
+        """Continue building a finished tree.
+
+        The arrays of compact_tree are extended in place.  open_nodes
+        must be a prefix of its right most path.
+        """
+        assert self.label_dictionary is compact_tree.label_dictionary
+        self.labels = compact_tree.labels
+        self.parents = compact_tree.parents
+        self.depths = compact_tree.depths
+        self.ends = compact_tree.ends
+        self.levels = compact_tree.levels
+        self.roots = roots
+        self.open_nodes = list(open_nodes)
+        return
+
+
+    def _close(self):
+        """Close any open nodes."""
+        assert len(self.labels) > 0, "Compact trees require a root.\n"
+        while self.open_nodes:
+            self.pop()
+        return
+
+
+    def finish(self):
+        """Close any open nodes and return the completed CompactTree."""
+        self._close()
+        assert len(self.roots) == 1, "Compact trees have a single root.\n"
+        return CompactTree(self.label_dictionary, self.labels, self.parents,
+                self.depths, self.ends, self.levels)
+
+
+    def finish_forest(self):
+        """Close any open nodes and return the completed Forest."""
+        self._close()
+        return Forest(self.label_dictionary, self.labels, self.parents,
+                self.depths, self.ends, self.levels, self.roots)
+
+
+class CompactTree():
+    """Frozen, array backed ordered tree.
+
+    Nodes are identified by their depth first pre-order position, with
+    the root at position 0.  For each node the tree stores the label
+    assigned to its state by a LabelDictionary, the position of its
+    parent (-1 for the root), its depth, and the end of its subtree.
+    The nodes rooted under position i occupy the range [i, ends[i]).
+    levels lists the positions found at each depth and is used to find
+    ancestors.
+
+    Sets of nodes, such as the right most occurrences of a pattern, are
+    held as sorted integer arrays of positions.  These are NumPy arrays
+    when NumPy is available and array.array otherwise.
+
+    This holds the same information that OrderedTreeNode.lock_tree
+    computes, but in typed arrays instead of per-node objects.
+    CompactTreeNode provides a TreeNode compatible view of a node.
+
+    Existing nodes never change, but new nodes may be appended below
+    the right most path using append_subtree.  They then follow every
+    existing node in pre-order, so existing positions stay valid.
+
+    The arrays may also be read only NumPy arrays, as when a tree is
+    memory mapped by treeio.load_binary.
+    """
+
+    def __init__(self, label_dictionary, labels, parents, depths, ends,
+            levels):
+        self.label_dictionary = label_dictionary
+        self.labels = labels
+        self.parents = parents
+        self.depths = depths
+        self.ends = ends
+        self.levels = levels
+        self.numpy_index = None
+        self.subtree_ids = None
+
+
+    def get_num_nodes(self):
+        """Return the number of nodes in the tree."""
+        return len(self.labels)
+
+
+    def lock_tree(self):
+        """Compact trees are always locked."""
+        return
+
+
+    def get_compact_tree(self):
+        """Return self, matching TreeNode.get_compact_tree."""
+        return self
+
+
+    def get_support_base(self):
+        """Return the count that minimum supports are fractions of.
+
+        The support of a pattern in a single tree is its number of
+        right most occurrences, out of the number of nodes.
+        """
+        return self.get_num_nodes()
+
+
+    def count_support(self, rmos):
+        """Return the support of a pattern with right most occurrences
+        rmos."""
+        return len(rmos)
+
+
+    def has_monotone_support(self):
+        """Return whether support never grows as a pattern is expanded.
+
+        A pattern can have more right most occurrences than the pattern
+        it was expanded from, so this does not hold in a single tree.
+        """
+        return False
+
+
+    def get_state(self, position):
+        """Return the state of the node at position."""
+        return self.label_dictionary.get_state(self.labels[position])
+
+
+    def get_pth_parent(self, position, p):
+        """Return the position of the pth parent of position."""
+        return level_ancestor(self.levels, position, self.depths[position], p)
+
+
+    def get_label_dictionary(self):
+        """Return the dictionary used to label the states of the tree."""
+        return self.label_dictionary
+
+
+    def get_subtree_ids(self):
+        """Return the array of the ids of the subtrees rooted at each
+        position.
+
+        Positions have the same id exactly when their rooted subtrees
+        are structurally equal.  Ids are found in one pre-order pass
+        that keeps only the ids of the children of the open nodes, and
+        are cached until nodes are appended.  Subtrees are hash-consed
+        in a table private to the pass, so ids only compare within this
+        tree, and the keys of subtrees changed by later appends are not
+        kept alive.
+        """
+        if self.subtree_ids is None:
+            labels = self.labels
+            ends = self.ends
+            get_subtree_id = LabelDictionary().get_subtree_id
+            subtree_ids = array.array('i', [0]) * self.get_num_nodes()
+            open_nodes = []
+            for position in range(self.get_num_nodes() + 1):
+                while open_nodes and (position == len(labels) or
+                        ends[open_nodes[-1][0]] <= position):
+                    (closed, child_ids) = open_nodes.pop()
+                    subtree_ids[closed] = get_subtree_id(int(labels[closed]),
+                            tuple(child_ids))
+                    if open_nodes:
+                        open_nodes[-1][1].append(subtree_ids[closed])
+                if position < len(labels):
+                    open_nodes.append((position, []))
+            self.subtree_ids = subtree_ids
+        return self.subtree_ids
+
+
+    def group_identical_subtrees(self):
+        """Group the positions whose rooted subtrees are structurally
+        equal.
+
+        Returns a dictionary mapping each subtree id that roots more
+        than one position to the sorted list of those positions.  This
+        takes a single pass over the subtree ids.
+        """
+        groups = {}
+        for (position, subtree_id) in enumerate(self.get_subtree_ids()):
+            groups.setdefault(subtree_id, []).append(position)
+        for (subtree_id, positions) in groups.items():
+            if len(positions) < 2:
+                del groups[subtree_id]
+        return groups
+
+
+    def get_node(self, position):
+        """Return a CompactTreeNode view of the node at position."""
+        return CompactTreeNode(self, position)
+
+
+    def get_root(self):
+        """Return a CompactTreeNode view of the root."""
+        return CompactTreeNode(self, 0)
+
+
+    def iter_children(self, position):
+        """Yield the positions of the children of position in order."""
+        end = self.ends[position]
+        child = position + 1
+        while child < end:
+            yield child
+            child = self.ends[child]
+
+
+    def get_right_most_path(self):
+        """Return the positions on the path from the root of the last
+        tree to the last node in pre-order."""
+        last = self.get_num_nodes() - 1
+        return array.array('i', [self.levels[depth][-1] for depth in
+            range(self.depths[last] + 1)])
+
+
+    def append_subtree(self, tree_string, parent):
+        """Append the trees of an unrooted build string below parent.
+
+        parent must lie on the right most path, and the new trees become
+        its last children.  Returns the position of the first new node.
+        """
+        path = self.get_right_most_path()
+        depth = self.depths[parent]
+        assert depth < len(path) and path[depth] == parent, \
+                "Appends must be below the right most path.\n"
+        return self._append(tree_string, array.array('i', [0]),
+                path[:depth + 1])
+
+
+    def _append(self, tree_string, roots, open_nodes):
+        """Append the trees of tree_string below the last of open_nodes,
+        or as new roots if there are none."""
+
+        assert isinstance(self.labels, array.array), \
+                "Memory mapped trees are read only.\n"
+
+        # Check the string before changing any arrays
+        tokens = tree_string.split()
+        depth = 0
+        for token in tokens:
+            if token == '-1':
+                assert depth > 0, "Malformed build string.\n"
+                depth -= 1
+            else:
+                assert token != '-2', "Appends can not return to the root.\n"
+                depth += 1
+        assert depth == 0, "Malformed build string.\n"
+
+        # Views sharing memory with the arrays would block resizing them
+        self.numpy_index = None
+        self.subtree_ids = None
+
+        first = self.get_num_nodes()
+        builder = CompactTreeBuilder(self.label_dictionary)
+        builder._reopen(self, roots, open_nodes)
+        for token in tokens:
+            if token == '-1':
+                builder.pop()
+            else:
+                builder.push(token)
+
+        # Closing the ancestors of the new nodes moves their ends
+        builder._close()
+        return first
+
+
+    def _get_numpy_index(self):
+        """Return NumPy versions of the arrays used to find occurrences.
+
+        Besides labels, parents and ends, this includes a compressed
+        child index: children lists every non-root position grouped by
+        parent and in pre-order within each group, the children of
+        position i are children[child_offsets[i]:child_offsets[i + 1]],
+        and slots gives the index of each position within children.
+        """
+        if self.numpy_index is None:
+            labels = as_numpy_array(self.labels)
+            parents = as_numpy_array(self.parents)
+            ends = as_numpy_array(self.ends)
+            num_nodes = len(labels)
+
+            non_roots = numpy.flatnonzero(parents >= 0)
+            order = numpy.argsort(parents[non_roots], kind='mergesort')
+            children = non_roots[order].astype(numpy.intc)
+            counts = numpy.bincount(parents[non_roots], minlength=num_nodes)
+            child_offsets = numpy.zeros(num_nodes + 1, dtype=numpy.intc)
+            numpy.cumsum(counts, out=child_offsets[1:])
+            slots = numpy.zeros(num_nodes, dtype=numpy.intc)
+            slots[children] = numpy.arange(len(children), dtype=numpy.intc)
+
+            self.numpy_index = (labels, parents, ends, children,
+                    child_offsets, slots)
+        return self.numpy_index
+
+
+    def get_label_occurrences(self):
+        """Return a dictionary mapping each label to the sorted array of
+        positions having that label."""
+        if numpy is not None:
+            labels = self._get_numpy_index()[0]
+            order = numpy.argsort(labels, kind='mergesort').astype(numpy.intc)
+            sorted_labels = labels[order]
+            bounds = numpy.flatnonzero(sorted_labels[1:] != sorted_labels[:-1]) + 1
+            starts = numpy.concatenate(([0], bounds))
+            stops = numpy.concatenate((bounds, [len(order)]))
+            occurrences = {}
+            for (start, stop) in zip(starts, stops):
+                occurrences[int(sorted_labels[start])] = order[start:stop]
+            return occurrences
+
+        occurrences = {}
+        for (position, label) in enumerate(self.labels):
+            if label not in occurrences:
+                occurrences[label] = array.array('i')
+            occurrences[label].append(position)
+        return occurrences
+
+
+    def expand_occurrences(self, rmos, p, l):
+        """Right most expand a set of occurrences.
+
+        rmos is a sorted array of positions of the right most leaves of
+        the occurrences of a pattern.  The result is the sorted array of
+        positions with label l that can be attached as the last child
+        of the pth parent of one of these right most leaves: children of
+        the leaf itself when p is 0, and otherwise children of the pth
+        parent found after the branch holding the leaf.
+        """
+        return self.group_expansions(rmos, p, [l]).get(l, self._empty())
+
+
+    def group_expansions(self, rmos, p, token_space=None, threshold=None,
+            budget=None):
+        """Right most expand a set of occurrences by every label at once.
+
+        This makes a single pass over rmos and returns a dictionary
+        mapping each label to the same sorted array expand_occurrences
+        returns for that label.  Labels with no occurrences are left
+        out.  If token_space is given only its labels are considered.
+
+        If threshold is given, only labels with more than threshold
+        occurrences are returned, and the scan stops early once the
+        candidates left to visit can not lift any label past it.
+
+        If budget is given, the number of candidate children scanned is
+        charged to it as candidates.
+        """
+        if numpy is not None:
+            return self._group_expansions_numpy(rmos, p, token_space,
+                    threshold, budget)
+        return self._group_expansions_python(rmos, p, token_space, threshold,
+                budget)
+
+
+    def _empty(self):
+        """Return an empty array of positions."""
+        if numpy is not None:
+            return numpy.zeros(0, dtype=numpy.intc)
+        return array.array('i')
+
+
+    def _group_expansions_python(self, rmos, p, token_space, threshold,
+            budget=None):
+        """Pure Python version of group_expansions."""
+        parents = self.parents
+        ends = self.ends
+        labels = self.labels
+        if token_space is not None:
+            token_space = set(token_space)
+
+        # Find the range of positions holding candidate siblings below
+        # each pth parent.  Ranges below the same parent share an end,
+        # so only the earliest start is needed.
+        starts = {}
+        for rmo in rmos:
+            if p == 0:
+                (parent, start) = (rmo, rmo + 1)
+            else:
+                branch = rmo
+                for i in range(p - 1):
+                    branch = parents[branch]
+                (parent, start) = (parents[branch], ends[branch])
+            if parent not in starts or start < starts[parent]:
+                starts[parent] = start
+
+        # Each range holds at most as many candidates as positions, so
+        # the positions left to scan bound the growth of any label.
+        if threshold is None:
+            threshold = -1
+        remaining = 0
+        for (parent, start) in starts.items():
+            remaining += ends[parent] - start
+        if remaining <= threshold:
+            return {}
+
+        # The children of different parents are disjoint, so no
+        # position is found twice.
+        groups = {}
+        most = 0
+        scanned = 0
+        for (parent, child) in starts.items():
+            end = ends[parent]
+            remaining -= end - child
+            while child < end:
+                label = labels[child]
+                if token_space is None or label in token_space:
+                    group = groups.setdefault(label, [])
+                    group.append(child)
+                    most = max(most, len(group))
+                child = ends[child]
+                scanned += 1
+            if most + remaining <= threshold:
+                groups = {}
+                break
+        if budget is not None:
+            budget.charge(candidates=scanned)
+
+        frequent = {}
+        for (label, rmo_new) in groups.items():
+            if len(rmo_new) > threshold:
+                rmo_new.sort()
+                frequent[label] = array.array('i', rmo_new)
+        return frequent
+
+
+    def _group_expansions_numpy(self, rmos, p, token_space, threshold,
+            budget=None):
+        """NumPy version of group_expansions."""
+        (labels, parents, ends, children, child_offsets, slots) = \
+                self._get_numpy_index()
+        rmos = as_numpy_array(rmos)
+        if len(rmos) == 0:
+            return {}
+
+        # Locate candidates as ranges of the child index
+        if p == 0:
+            parent = rmos
+            start = child_offsets[rmos]
+        else:
+            branch = rmos
+            for i in range(p - 1):
+                branch = parents[branch]
+            parent = parents[branch]
+            start = slots[branch] + 1
+
+        # Keep the earliest start for each parent
+        order = numpy.lexsort((start, parent))
+        parent = parent[order]
+        first = numpy.ones(len(parent), dtype=bool)
+        first[1:] = parent[1:] != parent[:-1]
+        parent = parent[first]
+        start = start[order][first]
+
+        # The child index gives the exact number of candidates before
+        # any are gathered.
+        stop = child_offsets[parent + 1]
+        if threshold is None:
+            threshold = -1
+        scanned = int((stop - start).sum())
+        if scanned <= threshold:
+            return {}
+        if budget is not None:
+            budget.charge(candidates=scanned)
+
+        candidates = children[expand_ranges(start, stop)]
+        candidate_labels = labels[candidates]
+        if token_space is not None:
+            keep = numpy.in1d(candidate_labels,
+                    numpy.asarray(list(token_space), dtype=numpy.intc))
+            candidates = candidates[keep]
+            candidate_labels = candidate_labels[keep]
+        if threshold >= 0:
+            counts = numpy.bincount(candidate_labels)
+            keep = counts[candidate_labels] > threshold
+            candidates = candidates[keep]
+            candidate_labels = candidate_labels[keep]
+
+        # Sort by label and then position and split into groups
+        order = numpy.lexsort((candidates, candidate_labels))
+        candidates = candidates[order]
+        candidate_labels = candidate_labels[order]
+        bounds = numpy.flatnonzero(
+                candidate_labels[1:] != candidate_labels[:-1]) + 1
+        starts = numpy.concatenate(([0], bounds))
+        stops = numpy.concatenate((bounds, [len(candidates)]))
+        groups = {}
+        for (start, stop) in zip(starts, stops):
+            if stop > start:
+                groups[int(candidate_labels[start])] = candidates[start:stop]
+        return groups
+
+
+    @classmethod
+    def from_tree(self, root, label_dictionary=None):
+        """Build a CompactTree from the TreeNode tree rooted at root."""
+        builder = CompactTreeBuilder(label_dictionary)
+        builder.add_tree(root)
+        return builder.finish()
+
+
+    @classmethod
+    def build_tree_from_string(self, tree_string, root_state,
+            label_dictionary=None):
+        """Build a CompactTree rooted at a node with root_state.
+
+        The tree_string describes the children of the root using the
+        format of TreeNode.build_tree_from_string.
+        """
+        builder = CompactTreeBuilder(label_dictionary)
+        builder.push(root_state)
+        builder.add_tokens(tree_string.split())
+        return builder.finish()
+
+
+    @classmethod
+    def unrooted_build_tree_from_string(self, tree_string,
+            label_dictionary=None):
+        """Similar to build_tree_from_string but also creates the root."""
+        state = tree_string.split()
+        builder = CompactTreeBuilder(label_dictionary)
+        builder.push(state[0])
+        builder.add_tokens(state[1:-1])
+        return builder.finish()
+
+
+class Forest(CompactTree):
+    """Collection of ordered trees mined together.
+
+    The trees are stored back to back in one set of CompactTree arrays,
+    so a position identifies a node in one of the trees.  Each tree's
+    root has parent -1, roots lists the position of each root, and
+    tree_ids gives the index of the tree holding each position.
+
+    The support of a pattern in a forest is the number of trees it
+    occurs in, out of the number of trees.  Since positions of one tree
+    are contiguous, the trees of a sorted array of occurrences are found
+    by counting changes of tree id.
+    """
+
+    def __init__(self, label_dictionary, labels, parents, depths, ends,
+            levels, roots, tree_ids=None):
+        CompactTree.__init__(self, label_dictionary, labels, parents, depths,
+                ends, levels)
+        self.roots = roots
+        if tree_ids is None:
+            tree_ids = array.array('i')
+            for (tree_id, root) in enumerate(roots):
+                tree_ids.extend([tree_id] * (ends[root] - root))
+        self.tree_ids = tree_ids
+        self.numpy_tree_ids = None
+
+
+    def get_num_trees(self):
+        """Return the number of trees in the forest."""
+        return len(self.roots)
+
+
+    def get_tree_root(self, tree_id):
+        """Return a CompactTreeNode view of the root of a tree."""
+        return CompactTreeNode(self, self.roots[tree_id])
+
+
+    def get_tree_id(self, position):
+        """Return the index of the tree holding position."""
+        return self.tree_ids[position]
+
+
+    def get_support_base(self):
+        """Return the number of trees in the forest."""
+        return self.get_num_trees()
+
+
+    def count_support(self, rmos):
+        """Return the number of trees holding an occurrence in rmos."""
+        if len(rmos) == 0:
+            return 0
+        if numpy is not None:
+            if self.numpy_tree_ids is None:
+                self.numpy_tree_ids = as_numpy_array(self.tree_ids)
+            tree_ids = self.numpy_tree_ids[as_numpy_array(rmos)]
+            return 1 + int(numpy.count_nonzero(tree_ids[1:] != tree_ids[:-1]))
+
+        tree_ids = self.tree_ids
+        support = 1
+        last = tree_ids[rmos[0]]
+        for rmo in rmos:
+            if tree_ids[rmo] != last:
+                support += 1
+                last = tree_ids[rmo]
+        return support
+
+
+    def has_monotone_support(self):
+        """Every tree holding a pattern holds the patterns it was
+        expanded from."""
+        return True
+
+
+    def get_occurring_trees(self, rmos):
+        """Return the sorted ids of the trees holding an occurrence in
+        rmos."""
+        if numpy is not None:
+            if self.numpy_tree_ids is None:
+                self.numpy_tree_ids = as_numpy_array(self.tree_ids)
+            tree_ids = self.numpy_tree_ids[as_numpy_array(rmos)]
+            if len(tree_ids) == 0:
+                return tree_ids
+            first = numpy.ones(len(tree_ids), dtype=bool)
+            first[1:] = tree_ids[1:] != tree_ids[:-1]
+            return tree_ids[first]
+
+        occurring = array.array('i')
+        for rmo in rmos:
+            tree_id = self.tree_ids[rmo]
+            if not occurring or occurring[-1] != tree_id:
+                occurring.append(tree_id)
+        return occurring
+
+
+    def append_subtree(self, tree_string, parent=None):
+        """Append trees to the forest.
+
+        With a parent on the right most path of the last tree the trees
+        of the unrooted build string become its last children, as with
+        CompactTree.append_subtree.  Otherwise each is added to the
+        forest as a new tree.  Returns the position of the first new
+        node.
+        """
+        if parent is None:
+            open_nodes = []
+        else:
+            path = self.get_right_most_path()
+            depth = self.depths[parent]
+            assert depth < len(path) and path[depth] == parent, \
+                    "Appends must be below the right most path.\n"
+            open_nodes = path[:depth + 1]
+
+        self.numpy_tree_ids = None
+        first = self._append(tree_string, self.roots, open_nodes)
+        for position in range(first, self.get_num_nodes()):
+            self.tree_ids.append(bisect.bisect_right(self.roots, position) - 1)
+        return first
+
+
+    @classmethod
+    def from_trees(self, roots, label_dictionary=None):
+        """Build a Forest from a list of TreeNode roots."""
+        builder = CompactTreeBuilder(label_dictionary)
+        for root in roots:
+            builder.add_tree(root)
+        return builder.finish_forest()
+
+
+    @classmethod
+    def from_strings(self, tree_strings, label_dictionary=None):
+        """Build a Forest from a list of unrooted build strings."""
+        builder = CompactTreeBuilder(label_dictionary)
+        for tree_string in tree_strings:
+            state = tree_string.split()
+            builder.push(state[0])
+            builder.add_tokens(state[1:-1])
+            builder.pop()
+            assert not builder.open_nodes, "Malformed build string.\n"
+        return builder.finish_forest()
+
+
+class CompressedTreeBuilder():
+    """Build a CompressedTree one node at a time.
+
+    Nodes are pushed and popped as with CompactTreeBuilder.  When a node
+    is popped its rooted subtree is looked up by subtree id in the
+    label dictionary, and only stored if no identical subtree has been
+    seen before.  Besides the distinct subtrees, only the children of
+    the currently open nodes are held in memory.
+    """
+
+    def __init__(self, label_dictionary=None):
+        if label_dictionary is None:
+            label_dictionary = LabelDictionary()
+        self.label_dictionary = label_dictionary
+        self.labels = array.array('i')
+        self.sizes = array.array('i')
+        self.child_offsets = array.array('i', [0])
+        self.children = array.array('i')
+        self.nodes = {}
+        self.open_nodes = []
+        self.closed = False
+
+
+    def push(self, state):
+        """Open a new node with state below the current node."""
+        assert self.open_nodes or not self.closed, \
+                "Compressed trees have a single root.\n"
+        self.open_nodes.append((self.label_dictionary.get_label(str(state)),
+            []))
+        return
+
+
+    def pop(self):
+        """Close the current node and return its node in the DAG."""
+        (label, child_ids) = self.open_nodes.pop()
+        subtree_id = self.label_dictionary.get_subtree_id(label,
+                tuple(child_ids))
+        node = self.nodes.get(subtree_id)
+        if node is None:
+            node = len(self.labels)
+            child_nodes = [self.nodes[child_id] for child_id in child_ids]
+            self.labels.append(label)
+            self.sizes.append(1 + sum([self.sizes[child] for child in
+                child_nodes]))
+            self.children.extend(child_nodes)
+            self.child_offsets.append(len(self.children))
+            self.nodes[subtree_id] = node
+        if self.open_nodes:
+            self.open_nodes[-1][1].append(subtree_id)
+        else:
+            self.closed = True
+        return node
+
+
+    def add_tokens(self, tokens, close_roots=False):
+        """Consume a list of build string tokens.  See
+        CompactTreeBuilder.add_tokens."""
+        for token in tokens:
+            if token == '-1':
+                assert len(self.open_nodes) > 1 or \
+                        (close_roots and self.open_nodes), \
+                        "Malformed build string.\n"
+                self.pop()
+            elif token == '-2':
+                while len(self.open_nodes) > 1:
+                    self.pop()
+            else:
+                self.push(token)
+        return
+
+
+    def add_tree(self, root):
+        """Add the TreeNode tree rooted at root below the current node."""
+        work_list = [(root, False)]
+        while work_list:
+            (node, visited) = work_list.pop()
+            if visited:
+                self.pop()
+            else:
+                self.push(node.state)
+                work_list.append((node, True))
+                for child in reversed(node.get_children()):
+                    work_list.append((child, False))
+        return
+
+
+    def finish(self):
+        """Close any open nodes and return the completed CompressedTree."""
+        while self.open_nodes:
+            self.pop()
+        assert self.closed, "Compressed trees require a root.\n"
+        return CompressedTree(self.label_dictionary, self.labels, self.sizes,
+                self.child_offsets, self.children)
+
+
+class CompressedTree():
+    """Ordered tree stored as a DAG of its distinct subtrees.
+
+    Identical rooted subtrees are hash-consed by subtree id into a
+    single DAG node, so a tree with many repeated subtrees is stored in
+    space proportional to its number of distinct subtrees.  DAG nodes
+    are numbered in the order their subtrees were first closed, so the
+    children of a node always come before it and the root is the last
+    node.  For each node the DAG stores its label, the number of nodes
+    in its expanded subtree, and its ordered children as
+    children[child_offsets[i]:child_offsets[i + 1]].  multiplicities
+    gives the number of times each subtree occurs in the expanded tree.
+
+    The tree can be mined with freqt and iter_freqt in mode "all"
+    without expanding it.  The occurrence of a pattern rooted at some
+    node only depends on the subtree of that node, so it occurs the
+    same way under every copy of the subtree.  A right most occurrence
+    is therefore held as a pair (node, path) of the DAG node the
+    pattern is rooted at and the child indices leading from it to the
+    right most leaf, and stands for one occurrence under each copy of
+    node.  Occurrences are sorted lists of such pairs, and the support
+    of a pattern is the number of right most occurrences in the
+    expanded tree, found by weighting each pair by the multiplicity of
+    its node.  get_positions maps occurrences to positions in the
+    expanded tree.
+    """
+
+    def __init__(self, label_dictionary, labels, sizes, child_offsets,
+            children):
+        self.label_dictionary = label_dictionary
+        self.labels = labels
+        self.sizes = sizes
+        self.child_offsets = child_offsets
+        self.children = children
+        self.root = len(labels) - 1
+        self.copies = None
+
+        # Parents come after their children, so a reverse pass pushes
+        # each node's multiplicity down to its children
+        multiplicities = array.array('i', [0]) * len(labels)
+        multiplicities[self.root] = 1
+        for node in range(self.root, -1, -1):
+            for i in range(child_offsets[node], child_offsets[node + 1]):
+                multiplicities[children[i]] += multiplicities[node]
+        self.multiplicities = multiplicities
+
+
+    def get_num_nodes(self):
+        """Return the number of nodes in the expanded tree."""
+        return self.sizes[self.root]
+
+
+    def get_num_distinct_subtrees(self):
+        """Return the number of nodes in the DAG."""
+        return len(self.labels)
+
+
+    def lock_tree(self):
+        """Compressed trees are always locked."""
+        return
+
+
+    def get_compact_tree(self):
+        """Return self, which provides the interface freqt mines over."""
+        return self
+
+
+    def get_support_base(self):
+        """Return the number of nodes in the expanded tree.  See
+        CompactTree.get_support_base."""
+        return self.get_num_nodes()
+
+
+    def count_support(self, rmos):
+        """Return the number of right most occurrences in the expanded
+        tree represented by rmos."""
+        multiplicities = self.multiplicities
+        return sum([multiplicities[node] for (node, path) in rmos])
+
+
+    def has_monotone_support(self):
+        """Support counts right most occurrences, as in CompactTree."""
+        return False
+
+
+    def get_label_dictionary(self):
+        """Return the dictionary used to label the states of the tree."""
+        return self.label_dictionary
+
+
+    def get_label_occurrences(self):
+        """Return a dictionary mapping each label to the occurrences of
+        the single node pattern with that label."""
+        occurrences = {}
+        for (node, label) in enumerate(self.labels):
+            occurrences.setdefault(label, []).append((node, ()))
+        return occurrences
+
+
+    def _empty(self):
+        """Return an empty list of occurrences."""
+        return []
+
+
+    def _find(self, node, path):
+        """Return the DAG node reached from node by following path."""
+        for index in path:
+            node = self.children[self.child_offsets[node] + index]
+        return node
+
+
+    def expand_occurrences(self, rmos, p, l):
+        """Right most expand a set of occurrences.  See
+        CompactTree.expand_occurrences."""
+        return self.group_expansions(rmos, p, [l]).get(l, self._empty())
+
+
+    def group_expansions(self, rmos, p, token_space=None, threshold=None,
+            budget=None):
+        """Right most expand a set of occurrences by every label at once.
+
+        This matches CompactTree.group_expansions, except that threshold
+        is compared to the support of each expansion in the expanded
+        tree.  The pth parent of an occurrence is found by truncating
+        its path, so occurrences under the same pth parent share a
+        (node, path) key and, as in CompactTree, only the earliest start
+        below each parent is scanned.
+        """
+        labels = self.labels
+        children = self.children
+        child_offsets = self.child_offsets
+        multiplicities = self.multiplicities
+        if token_space is not None:
+            token_space = set(token_space)
+        if threshold is None:
+            threshold = -1
+
+        starts = {}
+        for (node, path) in rmos:
+            if p == 0:
+                (parent, start) = ((node, path), 0)
+            else:
+                depth = len(path) - p
+                (parent, start) = ((node, path[:depth]), path[depth] + 1)
+            if parent not in starts or start < starts[parent]:
+                starts[parent] = start
+
+        groups = {}
+        supports = {}
+        scanned = 0
+        for ((node, path), start) in starts.items():
+            parent = self._find(node, path)
+            multiplicity = multiplicities[node]
+            scanned += max(0, child_offsets[parent + 1] -
+                    child_offsets[parent] - start)
+            for index in range(start,
+                    child_offsets[parent + 1] - child_offsets[parent]):
+                label = labels[children[child_offsets[parent] + index]]
+                if token_space is None or label in token_space:
+                    groups.setdefault(label, []).append(
+                            (node, path + (index,)))
+                    supports[label] = supports.get(label, 0) + multiplicity
+
+        if budget is not None:
+            budget.charge(candidates=scanned)
+
+        frequent = {}
+        for (label, rmo_new) in groups.items():
+            if supports[label] > threshold:
+                rmo_new.sort()
+                frequent[label] = rmo_new
+        return frequent
+
+
+    def _get_copies(self):
+        """Return the positions of every copy of each DAG node within
+        the expanded tree.
+
+        This takes time and memory in the size of the expanded tree and
+        is only used to report positions.
+        """
+        if self.copies is None:
+            copies = [[] for node in range(len(self.labels))]
+            copies[self.root].append(0)
+            for node in range(self.root, -1, -1):
+                offset = 1
+                for i in range(self.child_offsets[node],
+                        self.child_offsets[node + 1]):
+                    child = self.children[i]
+                    copies[child].extend([position + offset for position in
+                        copies[node]])
+                    offset += self.sizes[child]
+            self.copies = copies
+        return self.copies
+
+
+    def get_positions(self, rmos):
+        """Return the sorted array of positions in the expanded tree of
+        the right most occurrences rmos."""
+        copies = self._get_copies()
+        positions = []
+        for (node, path) in rmos:
+            offset = 0
+            current = node
+            for index in path:
+                first = self.child_offsets[current]
+                offset += 1
+                for i in range(first, first + index):
+                    offset += self.sizes[self.children[i]]
+                current = self.children[first + index]
+            positions += [position + offset for position in copies[node]]
+        positions.sort()
+        return array.array('i', positions)
+
+
+    def expand(self):
+        """Return the expanded tree as a CompactTree sharing the label
+        dictionary."""
+        builder = CompactTreeBuilder(self.label_dictionary)
+        work_list = [(self.root, False)]
+        while work_list:
+            (node, visited) = work_list.pop()
+            if visited:
+                builder.pop()
+                continue
+            builder.push(self.label_dictionary.get_state(self.labels[node]))
+            work_list.append((node, True))
+            for i in range(self.child_offsets[node + 1] - 1,
+                    self.child_offsets[node] - 1, -1):
+                work_list.append((self.children[i], False))
+        return builder.finish()
+
+
+    @classmethod
+    def from_tree(self, root, label_dictionary=None):
+        """Build a CompressedTree from the TreeNode tree rooted at root."""
+        builder = CompressedTreeBuilder(label_dictionary)
+        builder.add_tree(root)
+        return builder.finish()
+
+
+    @classmethod
+    def build_tree_from_string(self, tree_string, root_state,
+            label_dictionary=None):
+        """Build a CompressedTree rooted at a node with root_state.  See
+        CompactTree.build_tree_from_string."""
+        builder = CompressedTreeBuilder(label_dictionary)
+        builder.push(root_state)
+        builder.add_tokens(tree_string.split())
+        return builder.finish()
+
+
+class CompactTreeNode():
+    """TreeNode compatible view of a node within a CompactTree.
+
+    Views are created on demand and hold only a reference to the tree
+    and the position of the node.  Two views are equal if they refer to
+    the same position of the same tree.  The underlying tree is frozen,
+    so views always behave as locked nodes.
+    """
+
+    def __init__(self, compact_tree, position):
+        self.tree = compact_tree
+        self.position = position
+        self.id = position
+        self.label = compact_tree.labels[position]
+        self.state = compact_tree.label_dictionary.get_state(self.label)
+        self.locked = True
+
+
+    def __eq__(self, other):
+        return isinstance(other, CompactTreeNode) and \
+                self.tree is other.tree and self.position == other.position
+
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+    def __hash__(self):
+        return hash((id(self.tree), self.position))
+
+
+    def lock_tree(self):
+        """Compact trees are always locked."""
+        return
+
+
+    def unlock_tree(self):
+        """Compact trees are frozen and can not be unlocked."""
+        assert False, "Compact trees can not be unlocked.\n"
+
+
+    def append_child(self, state=None):
+        """Compact trees are frozen and can not be extended."""
+        assert False, "Compact trees can not be extended.\n"
+
+
+    def get_num_children(self):
+        """Return the number of children of a node."""
+        return len(self.get_children())
+
+
+    def get_children(self):
+        """Return the children of a node."""
+        return [CompactTreeNode(self.tree, child)
+                for child in self.tree.iter_children(self.position)]
+
+
+    def get_parent(self):
+        """Return the parent of a node."""
+        parent = self.tree.parents[self.position]
+        if parent < 0:
+            return None
+        return CompactTreeNode(self.tree, parent)
+
+
+    def get_pth_parent(self, p):
+        """Return the pth parent of self.
+
+        The 0th parent of a node is itself.  Passing the root of the
+        tree raises an IndexError.
+        """
+        return CompactTreeNode(self.tree,
+                self.tree.get_pth_parent(self.position, p))
+
+
+    def get_depth(self):
+        """Return the depth of the current node."""
+        return self.tree.depths[self.position]
+
+
+    def get_tree_position(self):
+        """Return the pre-order position of the node in the tree."""
+        return self.position
+
+
+    def get_root(self):
+        """Return the root of the tree holding the node."""
+        return CompactTreeNode(self.tree, self.tree.get_pth_parent(
+            self.position, self.get_depth()))
+
+
+    def get_compact_tree(self):
+        """Return the CompactTree holding the node."""
+        return self.tree
+
+
+    def get_label_dictionary(self):
+        """Return the dictionary used to label the states of the tree."""
+        return self.tree.label_dictionary
+
+
+    def get_num_nodes(self):
+        """Return the number of nodes rooted under self (including self)."""
+        return self.tree.ends[self.position] - self.position
+
+
+    def get_nodes(self):
+        """Return the list of nodes in the tree rooted under self
+        (including self)."""
+        return [CompactTreeNode(self.tree, position) for position in
+                range(self.position, self.tree.ends[self.position])]
+
+
+    def is_descendant_of(self, other):
+        """Return True if self is rooted under other (excluding other)."""
+        return self.tree is other.tree and \
+                other.position < self.position < self.tree.ends[other.position]
+
+
+    def get_right_most_leaf(self):
+        """Return the right most leaf of the tree rooted at self."""
+        return CompactTreeNode(self.tree, self.tree.ends[self.position] - 1)
+
+
+    def get_subtree_id(self):
+        """Return the id of the subtree rooted at self.  See
+        CompactTree.get_subtree_ids."""
+        return self.tree.get_subtree_ids()[self.position]
+
+
+    def structural_equality(self, other):
+        """State and connectivity equality over the rooted subtree.
+
+        Nodes of the same tree are compared by subtree id.
+        """
+        if isinstance(other, CompactTreeNode) and self.tree is other.tree:
+            return self.get_subtree_id() == other.get_subtree_id()
+        return self.build_string_from_tree() == other.build_string_from_tree()
+
+
+    def build_string_from_tree(self):
+        """Generate a "build string" from rooted subtree."""
+        ends = self.tree.ends
+        tokens = []
+        open_ends = []
+        for position in range(self.position, ends[self.position]):
+            while open_ends and open_ends[-1] <= position:
+                open_ends.pop()
+                tokens.append("-1")
+            tokens.append(self.tree.get_state(position))
+            open_ends.append(ends[position])
+        tokens += ["-1"] * len(open_ends)
+        return " ".join(tokens)
+
+
+    def print_tree(self):
+        """Print the rooted tree."""
+        return "".join([str(node) for node in self.get_nodes()])
+
+
+    def __str__(self):
+        """Write node child relations."""
+        return "node_%d_%s [label=%s]\n" % (self.id, self.state, self.state)
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2009, Regents of the University of California
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#
+#     * Neither the name of the University of California, Los Angeles
+#     nor the names of its contributors may be used to endorse or
+#     promote products derived from this software without specific prior
+#     written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+# Author: Roy Shea
+# Date: June 2009
+
+import array
+import mmap
+import struct
+import sys
+import tree
+
+CHUNK_SIZE = 1 << 20
+
+def iter_token_chunks(source, chunk_size=CHUNK_SIZE):
+    """Split the build string read from source into lists of tokens.
+
+    source is any object with a read method, such as a file or an mmap.
+    It is read chunk_size bytes at a time, and a token cut by the end
+    of a chunk is carried over to the next.  Only one chunk and its
+    tokens are held in memory at once.
+    """
+
+    carry = ""
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        chunk = carry + chunk
+        tokens = chunk.split()
+        if tokens and not chunk[-1].isspace():
+            carry = tokens.pop()
+        else:
+            carry = ""
+        if tokens:
+            yield tokens
+    if carry:
+        yield [carry]
+
+
+def load_compact_tree(source, root_state=None, label_dictionary=None,
+        chunk_size=CHUNK_SIZE):
+    """Build a CompactTree from a build string read from source.
+
+    If root_state is given the string describes the children of a root
+    with that state, as in CompactTree.build_tree_from_string.
+    Otherwise it is an unrooted build string, as in
+    CompactTree.unrooted_build_tree_from_string, whose closing "-1"
+    may be left out.
+    """
+
+    builder = tree.CompactTreeBuilder(label_dictionary)
+    if root_state is not None:
+        builder.push(root_state)
+    for tokens in iter_token_chunks(source, chunk_size):
+        builder.add_tokens(tokens, root_state is None)
+    return builder.finish()
+
+
+def load_forest(source, label_dictionary=None, chunk_size=CHUNK_SIZE):
+    """Build a Forest from the unrooted build strings read from source.
+
+    The build strings may be separated by any white space, and each
+    tree is closed by the "-1" ending its build string.
+    """
+
+    builder = tree.CompactTreeBuilder(label_dictionary)
+    for tokens in iter_token_chunks(source, chunk_size):
+        builder.add_tokens(tokens, True)
+    assert not builder.open_nodes, "Malformed build string.\n"
+    return builder.finish_forest()
+
+
+def load_compressed_tree(source, root_state=None, label_dictionary=None,
+        chunk_size=CHUNK_SIZE):
+    """Build a CompressedTree from a build string read from source.
+
+    Identical subtrees are merged as they are read, so the expanded
+    tree is never held in memory.  See load_compact_tree.
+    """
+
+    builder = tree.CompressedTreeBuilder(label_dictionary)
+    if root_state is not None:
+        builder.push(root_state)
+    for tokens in iter_token_chunks(source, chunk_size):
+        builder.add_tokens(tokens, root_state is None)
+    return builder.finish()
+
+
+def open_mapped(filename):
+    """Open filename for reading through a read only memory map.
+
+    Empty files can not be mapped and are opened as plain files.
+    """
+
+    f = open(filename, "rb")
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, mmap.error):
+        return open(filename, "rb")
+    finally:
+        f.close()
+
+
+def load_file(filename, root_state=None, label_dictionary=None,
+        chunk_size=CHUNK_SIZE, compress=False):
+    """Build a CompactTree from the build string in filename.
+
+    The file is read in chunks through a memory map.  See
+    load_compact_tree.  If compress is set a CompressedTree is built
+    instead, as by load_compressed_tree.
+    """
+
+    if compress:
+        load = load_compressed_tree
+    else:
+        load = load_compact_tree
+    source = open_mapped(filename)
+    try:
+        return load(source, root_state, label_dictionary, chunk_size)
+    finally:
+        source.close()
+
+
+# Binary trees start with MAGIC followed by a header of little endian
+# 32 bit integers: the number of nodes, levels, roots and states, the
+# number of bytes used by the states, and whether the tree is a Forest.
+MAGIC = "PYOPTT\x00\x01"
+HEADER = struct.Struct("<8s6i")
+
+def _int32_bytes(values):
+    """Return values as little endian 32 bit integers."""
+    if tree.numpy is not None and isinstance(values, tree.numpy.ndarray):
+        return values.astype("<i4").tostring()
+    values = array.array('i', values)
+    assert values.itemsize == 4, "Binary trees use 32 bit integers.\n"
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tostring()
+
+
+def _read_int32s(mapped, offset, count):
+    """Return count little endian 32 bit integers of mapped starting at
+    offset, in place if NumPy is available."""
+    if tree.numpy is not None:
+        if count == 0:
+            return tree.numpy.zeros(0, dtype="<i4")
+        return tree.numpy.frombuffer(mapped, dtype="<i4", count=count,
+                offset=offset)
+    values = array.array('i')
+    values.fromstring(mapped[offset:offset + 4 * count])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def save_binary(t, filename):
+    """Write the locked tree t to filename in a binary format.
+
+    The file holds the states of the label dictionary followed by the
+    labels, parents, depths and ends of each node, the level index and,
+    for a Forest, the roots and tree ids.  Every array is stored as
+    little endian 32 bit integers aligned to 4 bytes, so load_binary
+    can use the file in place.
+    """
+
+    t.lock_tree()
+    data = t.get_compact_tree()
+    label_dictionary = data.get_label_dictionary()
+    num_nodes = data.get_num_nodes()
+    is_forest = isinstance(data, tree.Forest)
+    if is_forest:
+        roots = data.roots
+    else:
+        roots = [0]
+
+    # States are stored in the string form CompactTreeBuilder labels
+    encoded = [str(state) for state in label_dictionary.states]
+    states = "".join(encoded)
+    state_lengths = [len(state) for state in encoded]
+    level_offsets = [0]
+    for level in data.levels:
+        level_offsets.append(level_offsets[-1] + len(level))
+
+    f = open(filename, "wb")
+    try:
+        f.write(HEADER.pack(MAGIC, num_nodes, len(data.levels), len(roots),
+            len(state_lengths), len(states), int(is_forest)))
+        f.write(_int32_bytes(state_lengths))
+        f.write(states + "\0" * (-len(states) % 4))
+        for values in [data.labels, data.parents, data.depths, data.ends,
+                level_offsets]:
+            f.write(_int32_bytes(values))
+        for level in data.levels:
+            f.write(_int32_bytes(level))
+        f.write(_int32_bytes(roots))
+        if is_forest:
+            f.write(_int32_bytes(data.tree_ids))
+    finally:
+        f.close()
+    return
+
+
+def load_binary(filename, label_dictionary=None):
+    """Load a tree written by save_binary.
+
+    With NumPy the file is memory mapped and its arrays are used in
+    place as read only NumPy arrays.  There is no parse step, and
+    processes loading the same file, or forked after loading it, share
+    one copy through the page cache.  Without NumPy the arrays are
+    copied into memory.
+
+    The states are added to label_dictionary, or a new dictionary.  A
+    given dictionary must map the states of the file to the same
+    labels, for example by being empty.
+    """
+
+    f = open(filename, "rb")
+    try:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+
+    (magic, num_nodes, num_levels, num_roots, num_states, states_size,
+            is_forest) = HEADER.unpack_from(mapped, 0)
+    assert magic == MAGIC, "Not a binary tree file.\n"
+    offset = HEADER.size
+
+    state_lengths = _read_int32s(mapped, offset, num_states)
+    offset += 4 * num_states
+    if label_dictionary is None:
+        label_dictionary = tree.LabelDictionary()
+    start = offset
+    for (label, length) in enumerate(state_lengths):
+        state = mapped[start:start + length]
+        assert label_dictionary.get_label(state) == label, \
+                "Label dictionary does not match the file.\n"
+        start += length
+    offset += states_size + (-states_size % 4)
+
+    arrays = []
+    for count in [num_nodes] * 4 + [num_levels + 1, num_nodes, num_roots] + \
+            [num_nodes] * is_forest:
+        arrays.append(_read_int32s(mapped, offset, count))
+        offset += 4 * count
+    (labels, parents, depths, ends, level_offsets, positions, roots) = \
+            arrays[:7]
+    levels = [positions[level_offsets[depth]:level_offsets[depth + 1]]
+            for depth in range(num_levels)]
+
+    if is_forest:
+        return tree.Forest(label_dictionary, labels, parents, depths, ends,
+                levels, roots, arrays[7])
+    return tree.CompactTree(label_dictionary, labels, parents, depths, ends,
+            levels)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2009, Regents of the University of California
+#
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+#     notice, this list of conditions and the following disclaimer.
+#
+#     * Redistributions in binary form must reproduce the above
+#     copyright notice, this list of conditions and the following
+#     disclaimer in the documentation and/or other materials provided
+#     with the distribution.
+#
+#     * Neither the name of the University of California, Los Angeles
+#     nor the names of its contributors may be used to endorse or
+#     promote products derived from this software without specific prior
+#     written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Author: Roy Shea
+# Date: June 2009
+
+import json
+import struct
+import tree
+import treeio
+
+BUFFER_SIZE = 1 << 16
+
+class ResultWriter():
+    """Buffered writer of mined subtrees to a file handle.
+
+    Subtrees are written straight from their Pattern encoding, one at a
+    time, so a writer can be fed from iter_freqt or used as the
+    callback of freqt_dfs without first collecting the results.  Output
+    is gathered until about buffer_size bytes are pending and is then
+    written to out in a single call, keeping memory use bounded.
+    Subclasses implement write.
+
+    Occurrences mined from a tree.CompressedTree are (node, path) pairs
+    rather than positions.  They are mapped to positions in the
+    expanded tree if that tree is given as data, and are otherwise
+    rejected.
+    """
+
+    def __init__(self, out, label_dictionary, buffer_size=BUFFER_SIZE,
+            data=None):
+        self.out = out
+        self.label_dictionary = label_dictionary
+        self.buffer_size = buffer_size
+        self.data = data
+        self.pending = []
+        self.pending_size = 0
+
+
+    def _get_positions(self, rmos):
+        """Return the positions of the right most occurrences rmos."""
+        if isinstance(self.data, tree.CompressedTree):
+            return self.data.get_positions(rmos)
+        assert len(rmos) == 0 or not isinstance(rmos[0], tuple), \
+                "Compressed occurrences require the CompressedTree.\n"
+        return rmos
+
+
+    def _emit(self, text):
+        """Queue text for output, flushing once the buffer is full."""
+        self.pending.append(text)
+        self.pending_size += len(text)
+        if self.pending_size >= self.buffer_size:
+            self.flush()
+        return
+
+
+    def write(self, size, pattern, support, rmos):
+        """Write one subtree as yielded by iter_freqt."""
+        raise NotImplementedError
+
+
+    def write_results(self, results):
+        """Write each (size, pattern, support, rmos) tuple of results."""
+        for (size, pattern, support, rmos) in results:
+            self.write(size, pattern, support, rmos)
+        return
+
+
+    def flush(self):
+        """Write any pending output to out."""
+        if self.pending:
+            self.out.write("".join(self.pending))
+            self.pending = []
+            self.pending_size = 0
+        return
+
+
+    def close(self):
+        """Flush pending output.  out is left open."""
+        self.flush()
+        return
+
+
+class DotWriter(ResultWriter):
+    """Write each subtree as a Graphviz digraph.
+
+    Node names follow TreeNode.print_tree, with the pre-order position
+    of the node within the subtree used as its id.  Each digraph is
+    preceded by a comment giving its size and support.
+    """
+
+    def write(self, size, pattern, support, rmos):
+        self._emit("# size: %d support: %d\ndigraph {\n" % (size, support))
+        names = []
+        for (position, (depth, label)) in enumerate(pattern.get_sequence()):
+            state = self.label_dictionary.get_state(label)
+            del names[depth:]
+            names.append("node_%d_%s" % (position, state))
+            self._emit("%s [label=%s]\n" % (names[-1], state))
+            if depth > 0:
+                self._emit("%s -> %s\n" % (names[-2], names[-1]))
+        self._emit("}\n\n")
+        return
+
+
+class JsonLinesWriter(ResultWriter):
+    """Write each subtree as a line holding a JSON object.
+
+    Objects have the keys "size", "support" and "tree", the build
+    string of the subtree.  If occurrences is set, the positions of the
+    right most occurrences are included under "rmos".
+    """
+
+    def __init__(self, out, label_dictionary, occurrences=False,
+            buffer_size=BUFFER_SIZE, data=None):
+        ResultWriter.__init__(self, out, label_dictionary, buffer_size, data)
+        self.occurrences = occurrences
+
+
+    def write(self, size, pattern, support, rmos):
+        record = {"size": size, "support": int(support),
+                "tree": pattern.get_build_string(self.label_dictionary)}
+        if self.occurrences:
+            rmos = self._get_positions(rmos)
+            if tree.numpy is not None and isinstance(rmos, tree.numpy.ndarray):
+                record["rmos"] = rmos.tolist()
+            else:
+                record["rmos"] = list(rmos)
+        self._emit(json.dumps(record, sort_keys=True) + "\n")
+        return
+
+
+RESULTS_MAGIC = "PYOPTR\x00\x01"
+RECORD = struct.Struct("<3i")
+
+class BinaryWriter(ResultWriter):
+    """Write subtrees in a compact binary format.
+
+    The file starts with RESULTS_MAGIC, the number of states in
+    label_dictionary and each state as a length followed by its bytes.
+    Each subtree is then a record of its size, support and number of
+    stored rmos, followed by its (depth, label) sequence and the rmos,
+    all as little endian 32 bit integers.  The rmos are only stored if
+    occurrences is set.  See iter_binary_results.
+    """
+
+    def __init__(self, out, label_dictionary, occurrences=True,
+            buffer_size=BUFFER_SIZE, data=None):
+        ResultWriter.__init__(self, out, label_dictionary, buffer_size, data)
+        self.occurrences = occurrences
+        states = [str(state) for state in label_dictionary.states]
+        self._emit(RESULTS_MAGIC)
+        self._emit(treeio._int32_bytes([len(states)]))
+        for state in states:
+            self._emit(treeio._int32_bytes([len(state)]) + state)
+
+
+    def write(self, size, pattern, support, rmos):
+        if self.occurrences:
+            rmos = self._get_positions(rmos)
+        else:
+            rmos = []
+        self._emit(RECORD.pack(size, int(support), len(rmos)))
+        sequence = []
+        for (depth, label) in pattern.get_sequence():
+            sequence += [depth, label]
+        self._emit(treeio._int32_bytes(sequence))
+        self._emit(treeio._int32_bytes(rmos))
+        return
+
+
+def _read_exactly(source, count):
+    """Read count bytes from source."""
+    data = source.read(count)
+    assert len(data) == count, "Truncated results file.\n"
+    return data
+
+
+def _read_ints(source, count):
+    """Read count little endian 32 bit integers from source."""
+    return list(struct.unpack("<%di" % count, _read_exactly(source, 4 * count)))
+
+
+def iter_binary_results(source):
+    """Generate the (size, build_string, support, rmos) tuples written
+    by a BinaryWriter to source.
+
+    rmos is a list, which is empty if the writer did not store
+    occurrences.  Records are read one at a time.
+    """
+
+    assert _read_exactly(source, len(RESULTS_MAGIC)) == RESULTS_MAGIC, \
+            "Not a results file.\n"
+    states = []
+    for i in range(_read_ints(source, 1)[0]):
+        states.append(_read_exactly(source, _read_ints(source, 1)[0]))
+    while True:
+        header = source.read(RECORD.size)
+        if not header:
+            return
+        assert len(header) == RECORD.size, "Truncated results file.\n"
+        (size, support, num_rmos) = RECORD.unpack(header)
+        sequence = _read_ints(source, 2 * size)
+        tokens = []
+        open_depth = 0
+        for position in range(0, 2 * size, 2):
+            depth = sequence[position]
+            tokens += ["-1"] * (open_depth - depth)
+            tokens.append(states[sequence[position + 1]])
+            open_depth = depth + 1
+        tokens += ["-1"] * open_depth
+        yield (size, " ".join(tokens), support, _read_ints(source, num_rmos))